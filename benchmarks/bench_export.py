@@ -0,0 +1,77 @@
+"""
+Measure export throughput against the number of decode processes.
+
+Pages are served from memory, so the numbers show decode throughput rather than network speed. Each run
+decodes pages to projected records and encodes them as NDJSON, in process or in the workers.
+Run with: python benchmarks/bench_export.py [pages] [records per page]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, "src")
+
+from firewalla_unofficial_sdk.export import ExportPipeline, decode_page, encode_records  # noqa: E402
+
+FIELDS = ["ts", "gid", "device.name", "destination.name", "download", "upload", "block"]
+
+
+class MemoryClient:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get_raw(self, endpoint, params=None, timeout=10):
+        cursor = (params or {}).get("cursor")
+        return self.pages[int(cursor) if cursor else 0]
+
+
+def build_pages(count, size):
+    pages = []
+    for number in range(count):
+        records = [
+            {
+                "ts": 1700000000 + index,
+                "gid": "00000000-0000-0000-0000-000000000001",
+                "protocol": "tcp",
+                "block": index % 7 == 0,
+                "download": index * 13,
+                "upload": index * 7,
+                "device": {"id": "AA:BB:CC:DD:EE:01", "ip": "192.168.1.10", "name": "Laptop"},
+                "destination": {"name": f"host{index}.example.com", "ip": "93.184.216.34", "port": 443},
+            }
+            for index in range(number * size, (number + 1) * size)
+        ]
+        cursor = str(number + 1) if number + 1 < count else None
+        pages.append(json.dumps({"count": size, "results": records, "next_cursor": cursor}).encode())
+    return pages
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    pages = build_pages(count, size)
+    total = count * size
+
+    start = time.perf_counter()
+    for page in pages:
+        encode_records(decode_page(page, fields=FIELDS), "ndjson", FIELDS)
+    elapsed = time.perf_counter() - start
+    print(f"in-process:  {total / elapsed:10.0f} records/s")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        pipeline = ExportPipeline(
+            MemoryClient(pages), "flows", fields=FIELDS, workers=workers, prefetch=workers * 2, encoding="ndjson"
+        )
+        start = time.perf_counter()
+        for _ in pipeline:
+            pass
+        elapsed = time.perf_counter() - start
+        assert pipeline.records_exported == total
+        print(f"{workers:2d} workers:  {total / elapsed:10.0f} records/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
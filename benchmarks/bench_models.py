@@ -0,0 +1,101 @@
+"""
+Compare dict records with the typed response models on large flow and alarm pages.
+
+Models are built from the parsed records, so both columns include `json.loads`; the difference is the
+model construction time and the memory saved per record.
+
+Run with: python benchmarks/bench_models.py [records]
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, "src")
+
+from firewalla_unofficial_sdk.models import Alarm, Flow, decode  # noqa: E402
+
+
+def flow(index):
+    return {
+        "ts": 1700000000 + index,
+        "gid": "00000000-0000-0000-0000-000000000001",
+        "protocol": "tcp",
+        "direction": "outbound",
+        "block": index % 7 == 0,
+        "download": index * 13,
+        "upload": index * 7,
+        "duration": 1.5,
+        "count": 1,
+        "category": "edu",
+        "region": "US",
+        "device": {"id": f"AA:BB:CC:DD:{index % 256:02X}:01", "ip": "192.168.1.10", "name": "Laptop",
+                   "network": {"id": "n1", "name": "LAN"}},
+        "source": {"id": "s1", "name": "Laptop", "ip": "192.168.1.10", "port": 51000 + index % 1000},
+        "destination": {"id": "d1", "name": f"host{index}.example.com", "ip": "93.184.216.34", "port": 443},
+    }
+
+
+def alarm(index):
+    return {
+        "aid": index,
+        "gid": "00000000-0000-0000-0000-000000000001",
+        "type": 1,
+        "ts": 1700000000 + index,
+        "message": f"Laptop accessed host{index}.example.com",
+        "direction": "outbound",
+        "protocol": "tcp",
+        "alarmStatus": 1,
+        "device": {"id": "AA:BB:CC:DD:EE:01", "ip": "192.168.1.10", "name": "Laptop",
+                   "network": {"id": "n1", "name": "LAN"}},
+        "remote": {"name": f"host{index}.example.com", "ip": "93.184.216.34", "port": 443},
+    }
+
+
+def measure(content, model):
+    start = time.perf_counter()
+    json.loads(content)
+    parsed = time.perf_counter() - start
+    start = time.perf_counter()
+    models = decode(json.loads(content), model)["results"]
+    decoded = time.perf_counter() - start
+    start = time.perf_counter()
+    for record in models:
+        record.device
+    touched = time.perf_counter() - start
+    del models
+
+    # Memory is measured separately since tracemalloc slows allocation down
+    gc.collect()
+    tracemalloc.start()
+    records = json.loads(content)["results"]
+    dict_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+
+    gc.collect()
+    tracemalloc.start()
+    models = decode(json.loads(content), model)["results"]
+    gc.collect()
+    model_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del models
+    return parsed, decoded, touched, dict_memory, model_memory
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    for name, factory, model in (("flows", flow, Flow), ("alarms", alarm, Alarm)):
+        content = json.dumps({"count": count, "results": [factory(index) for index in range(count)]}).encode()
+        parsed, decoded, touched, dict_memory, model_memory = measure(content, model)
+        print(f"{name}: {count} records, {len(content) / 1e6:.1f} MB of JSON")
+        print(f"  dicts:  {parsed * 1e3:8.1f} ms  {dict_memory / count:7.0f} B/record")
+        print(f"  models: {decoded * 1e3:8.1f} ms  {model_memory / count:7.0f} B/record"
+              f"  (first .device access on every record: {touched * 1e3:.1f} ms)")
+        print(f"  models vs dicts: {(decoded - parsed) / count * 1e6:+.1f} us/record,"
+              f" {(model_memory - dict_memory) / dict_memory:+.0%} memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Compare fan-out GET throughput of the default `requests` path and the HTTP/2 transport.
+
+Runs against local stand-in servers that add a fixed latency to every response: a threaded
+HTTP/1.1 server and a plain-text HTTP/2 (h2c) server built on `h2`. Requires `httpx[http2]`.
+Run with: python benchmarks/bench_transport.py [requests] [concurrency] [latency ms]
+"""
+import json
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.settings
+
+sys.path.insert(0, "src")
+
+from firewalla_unofficial_sdk import Firewalla, Http2Transport  # noqa: E402
+
+BODY = json.dumps([
+    {"id": f"AA:BB:CC:DD:EE:{index:02X}", "name": f"device-{index}", "ip": f"192.168.1.{index}"}
+    for index in range(20)
+]).encode()
+
+
+class Http1Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.connections = 0
+        super().__init__(("127.0.0.1", 0), Http1Handler)
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+class Http1Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class H2cServer:
+    """
+    Minimal HTTP/2 server speaking h2c with prior knowledge. Every stream is answered after `latency` seconds.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.connections = 0
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.server_address = self.sock.getsockname()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self.handle, args=(sock,), daemon=True).start()
+
+    def handle(self, sock):
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        connection.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: 1000})
+        lock = threading.Lock()
+        pending = deque()
+        sock.sendall(connection.data_to_send())
+
+        def flush():
+            # Send queued responses while the flow control windows allow
+            while pending and connection.local_flow_control_window(pending[0]) >= len(BODY):
+                stream_id = pending.popleft()
+                connection.send_headers(stream_id, [
+                    (":status", "200"), ("content-type", "application/json"), ("content-length", str(len(BODY))),
+                ])
+                connection.send_data(stream_id, BODY, end_stream=True)
+            sock.sendall(connection.data_to_send())
+
+        def respond(stream_id):
+            with lock:
+                pending.append(stream_id)
+                flush()
+
+        with sock:
+            while True:
+                try:
+                    data = sock.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                with lock:
+                    for event in connection.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            threading.Timer(self.latency, respond, (event.stream_id,)).start()
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+                    flush()
+
+    def shutdown(self):
+        self.sock.close()
+
+
+def run(client, count, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda index: client.get_devices(box=f"box-{index}"), range(count)))
+    elapsed = time.perf_counter() - start
+    assert all(isinstance(result, list) for result in results), results[0]
+    return count / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    http1 = Http1Server(latency)
+    threading.Thread(target=http1.serve_forever, daemon=True).start()
+    h2c = H2cServer(latency)
+
+    def client(server, transport=None):
+        client = Firewalla("benchmark", "benchmark", transport=transport)
+        client.domain = "http://%s:%d" % server.server_address
+        return client
+
+    rate = run(client(http1), count, concurrency)
+    print(f"requests, HTTP/1.1:         {rate:8.0f} requests/s  {http1.connections:5d} connections")
+
+    http1.connections = 0
+    with Http2Transport() as transport:
+        rate = run(client(http1, transport), count, concurrency)
+    print(f"transport, HTTP/1.1 (32):   {rate:8.0f} requests/s  {http1.connections:5d} connections")
+
+    with Http2Transport(max_connections=4, http1=False) as transport:
+        rate = run(client(h2c, transport), count, concurrency)
+        versions = transport.metrics["responses"]
+    print(f"transport, HTTP/2 (4):      {rate:8.0f} requests/s  {h2c.connections:5d} connections  {versions}")
+
+    http1.shutdown()
+    h2c.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,34 @@
 from .main import Firewalla
+from .enrichment import FlowEnricher
+from .matcher import TargetListMatcher, MappedTargetListMatcher
+from .watch import AlarmWatcher
+from .hedging import HedgePolicy
+from .breaker import CircuitBreaker, CircuitBreakerRegistry
+from .cache import DiskCache
+from .export import ExportPipeline
+from .transport import Http2Transport
+from .trends import TrendSeries, TrendStore
+from .models import Box, Device, Alarm, Flow, TargetList, Rule, TrendPoint
 
-__all__ = ["Firewalla"]
\ No newline at end of file
+__all__ = [
+    "Firewalla",
+    "FlowEnricher",
+    "TargetListMatcher",
+    "MappedTargetListMatcher",
+    "AlarmWatcher",
+    "HedgePolicy",
+    "CircuitBreaker",
+    "CircuitBreakerRegistry",
+    "DiskCache",
+    "ExportPipeline",
+    "Http2Transport",
+    "TrendSeries",
+    "TrendStore",
+    "Box",
+    "Device",
+    "Alarm",
+    "Flow",
+    "TargetList",
+    "Rule",
+    "TrendPoint",
+]
\ No newline at end of file
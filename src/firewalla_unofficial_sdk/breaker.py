@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Literal, Optional, TypeAlias
+
+BreakerState: TypeAlias = Literal["closed", "open", "half_open"]
+StateChangeListener = Callable[[str, BreakerState, BreakerState], None]
+
+# Endpoints that share a breaker with another family
+ENDPOINT_FAMILIES: Dict[str, str] = {
+    "trends": "stats",
+}
+
+
+def endpoint_family(endpoint: str) -> str:
+    """
+    Get the endpoint family of an API endpoint, e.g. `flows` or `target-lists`.
+
+    Args:
+        endpoint (str): The API endpoint, e.g. `rules/123/pause`.
+
+    Returns:
+        str: The endpoint family.
+    """
+    family = endpoint.strip("/").split("/", 1)[0]
+    return ENDPOINT_FAMILIES.get(family, family)
+
+
+class CircuitBreaker:
+    '''
+    Circuit breaker
+    Fails calls fast while an endpoint family is failing or slow
+    '''
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: float = 5.0,
+        slow_call_rate_threshold: float = 0.8,
+        window: int = 20,
+        min_calls: int = 10,
+        reset_timeout: float = 30.0,
+        half_open_probes: int = 3,
+        on_state_change: Optional[StateChangeListener] = None,
+    ):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            name (str): The endpoint family the breaker protects.
+            failure_rate_threshold (float, optional): The share of failed calls that opens the breaker. Defaults to 0.5.
+            slow_call_threshold (float, optional): Seconds after which a call counts as slow. Defaults to 5 seconds.
+            slow_call_rate_threshold (float, optional): The share of slow calls that opens the breaker. Defaults to 0.8.
+            window (int, optional): The number of recent calls the rates are computed over. Defaults to 20.
+            min_calls (int, optional): The number of calls needed before the breaker can open. Defaults to 10.
+            reset_timeout (float, optional): Seconds the breaker stays open before probing. Defaults to 30 seconds.
+            half_open_probes (int, optional): The number of successful probes needed to close again. Defaults to 3.
+            on_state_change (StateChangeListener, optional): Called with the name, old and new state. Defaults to None.
+        """
+        self.name: str = name
+        self.failure_rate_threshold: float = failure_rate_threshold
+        self.slow_call_threshold: float = slow_call_threshold
+        self.slow_call_rate_threshold: float = slow_call_rate_threshold
+        self.min_calls: int = min_calls
+        self.reset_timeout: float = reset_timeout
+        self.half_open_probes: int = half_open_probes
+        self.on_state_change: Optional[StateChangeListener] = on_state_change
+        self.calls: deque = deque(maxlen=window)
+        self.opened_at: Optional[float] = None
+        self.rejected: int = 0
+        self._state: BreakerState = "closed"
+        self._probes: int = 0
+        self._probe_successes: int = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> BreakerState:
+        """
+        Get the breaker state, moving from open to half-open once the reset timeout has passed.
+        """
+        with self._lock:
+            notify = self._check_reset()
+            state = self._state
+        _notify(notify)
+        return state
+
+    def _check_reset(self) -> Optional[Callable[[], None]]:
+        if self._state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self._transition("half_open")
+        return None
+
+    def _transition(self, state: BreakerState) -> Optional[Callable[[], None]]:
+        """
+        Change state with the lock held. Returns the listener call, to be made once the lock is released.
+        """
+        old = self._state
+        self._state = state
+        self._probes = 0
+        self._probe_successes = 0
+        if state == "open":
+            self.opened_at = time.monotonic()
+        elif state == "closed":
+            self.calls.clear()
+            self.opened_at = None
+        listener = self.on_state_change
+        if listener is None:
+            return None
+        return lambda: listener(self.name, old, state)
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may proceed.
+
+        Returns:
+            bool: True when closed, or when half-open and a probe slot is free.
+        """
+        with self._lock:
+            notify = self._check_reset()
+            if self._state == "closed":
+                allowed = True
+            elif self._state == "half_open" and self._probes < self.half_open_probes:
+                self._probes += 1
+                allowed = True
+            else:
+                self.rejected += 1
+                allowed = False
+        _notify(notify)
+        return allowed
+
+    def record(self, success: bool, elapsed: float) -> None:
+        """
+        Record the outcome of a call.
+
+        Args:
+            success (bool): Whether the call succeeded.
+            elapsed (float): How long the call took in seconds.
+        """
+        slow = elapsed >= self.slow_call_threshold
+        notify = None
+        with self._lock:
+            if self._state == "half_open":
+                if not success or slow:
+                    notify = self._transition("open")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        notify = self._transition("closed")
+            elif self._state == "closed":
+                self.calls.append((success, slow))
+                if len(self.calls) >= self.min_calls:
+                    failures = sum(1 for ok, _ in self.calls if not ok) / len(self.calls)
+                    slow_calls = sum(1 for _, is_slow in self.calls if is_slow) / len(self.calls)
+                    if failures >= self.failure_rate_threshold or slow_calls >= self.slow_call_rate_threshold:
+                        notify = self._transition("open")
+        _notify(notify)
+
+    @property
+    def metrics(self) -> Dict:
+        """
+        Get the breaker metrics.
+
+        Returns:
+            Dict: The state, the failure and slow call rates over the window, and the number of rejected calls.
+        """
+        with self._lock:
+            notify = self._check_reset()
+            calls = list(self.calls)
+            metrics: Dict = {"state": self._state, "rejected": self.rejected, "calls": len(calls)}
+        _notify(notify)
+        metrics["failure_rate"] = sum(1 for ok, _ in calls if not ok) / len(calls) if calls else 0.0
+        metrics["slow_call_rate"] = sum(1 for _, slow in calls if slow) / len(calls) if calls else 0.0
+        return metrics
+
+
+def _notify(notify: Optional[Callable[[], None]]) -> None:
+    if notify is not None:
+        notify()
+
+
+class CircuitBreakerRegistry:
+    '''
+    Circuit breaker registry
+    Keeps one circuit breaker per endpoint family
+    '''
+
+    def __init__(self, on_state_change: Optional[StateChangeListener] = None, **options):
+        """
+        Initialize the registry.
+
+        Args:
+            on_state_change (StateChangeListener, optional): Called with the family, old and new state
+                                                             whenever a breaker changes state. Defaults to None.
+            **options: `CircuitBreaker` options applied to every breaker.
+        """
+        self.on_state_change: Optional[StateChangeListener] = on_state_change
+        self.options: Dict = options
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        """
+        Get the breaker of an endpoint's family, creating it on first use.
+
+        Args:
+            endpoint (str): The API endpoint.
+
+        Returns:
+            CircuitBreaker: The breaker of the endpoint family.
+        """
+        family = endpoint_family(endpoint)
+        breaker = self.breakers.get(family)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.get(family)
+                if breaker is None:
+                    breaker = self.breakers[family] = CircuitBreaker(
+                        family, on_state_change=self.on_state_change, **self.options
+                    )
+        return breaker
+
+    def states(self) -> Dict[str, BreakerState]:
+        """
+        Get the state of every breaker.
+
+        Returns:
+            Dict[str, BreakerState]: The state keyed by endpoint family.
+        """
+        return {family: breaker.state for family, breaker in list(self.breakers.items())}
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Optional
+
+from .breaker import endpoint_family
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    family TEXT NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+def default_cache_path() -> str:
+    """
+    Get the default cache file, under `$XDG_CACHE_HOME` or `~/.cache`.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "firewalla_unofficial_sdk", "responses.sqlite3")
+
+
+class DiskCache:
+    '''
+    Disk cache
+    SQLite-backed GET response cache shared by every process using the same file
+    '''
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        default_ttl: float = 300.0,
+        ttls: Optional[Dict[str, float]] = None,
+        endpoints: Iterable[str] = ("boxes", "devices", "target-lists"),
+        max_bytes: int = 64 * 1024 * 1024,
+        compression_level: int = 6,
+        busy_timeout: float = 5.0,
+        touch_interval: Optional[float] = None,
+    ):
+        """
+        Initialize the disk cache.
+
+        Args:
+            path (str, optional): The SQLite file. Defaults to `~/.cache/firewalla_unofficial_sdk/responses.sqlite3`.
+            default_ttl (float, optional): Seconds a response stays fresh. Defaults to 300 seconds.
+            ttls (Dict[str, float], optional): TTL overrides keyed by endpoint family. Defaults to None.
+            endpoints (Iterable[str], optional): The endpoint families to cache.
+                                                 Defaults to boxes, devices and target-lists.
+            max_bytes (int, optional): The compressed size above which least recently used responses are evicted.
+                                       Defaults to 64 MiB.
+            compression_level (int, optional): The zlib compression level of stored payloads. Defaults to 6.
+            busy_timeout (float, optional): Seconds to wait for another process holding the write lock. Defaults to 5 seconds.
+            touch_interval (float, optional): Seconds after which a hit refreshes an entry's last access time.
+                                              Hits in between only read, without taking the write lock.
+                                              Defaults to None (a tenth of the entry's TTL).
+        """
+        self.path: str = path or default_cache_path()
+        self.default_ttl: float = default_ttl
+        self.ttls: Dict[str, float] = dict(ttls or {})
+        self.endpoints = frozenset(endpoints)
+        self.max_bytes: int = max_bytes
+        self.compression_level: int = compression_level
+        self.busy_timeout: float = busy_timeout
+        self.touch_interval: Optional[float] = touch_interval
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "invalidations": 0, "errors": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Get this thread's connection; SQLite connections can't be shared between threads.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            # WAL lets readers in other processes proceed while one process writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+
+    def cacheable(self, endpoint: str) -> bool:
+        """
+        Check whether responses of an endpoint are cached.
+
+        Args:
+            endpoint (str): The API endpoint.
+
+        Returns:
+            bool: True if the endpoint's family is cached.
+        """
+        return endpoint_family(endpoint) in self.endpoints
+
+    def key(self, api_key: str, url: str, params: Optional[Dict]) -> str:
+        """
+        Build the cache key of a request. The API key is part of it so MSP accounts don't share entries.
+
+        Args:
+            api_key (str): The API key used for the request.
+            url (str): The request URL.
+            params (Dict, optional): The query parameters.
+
+        Returns:
+            str: The cache key.
+        """
+        request = json.dumps([api_key, url, params], sort_keys=True, default=str)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read a fresh response.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[bytes]: The response body, or None if it is missing, expired or unreadable.
+        """
+        now = time.time()
+        try:
+            with self._connection() as connection:
+                row = connection.execute(
+                    "SELECT payload, family, accessed FROM responses WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    interval = self.touch_interval
+                    if interval is None:
+                        interval = self.ttls.get(row[1], self.default_ttl) / 10
+                    # Eviction only needs a rough recency, so most hits stay read-only
+                    if now - row[2] >= interval:
+                        connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            if row is None:
+                self._count("misses")
+                return None
+            content = zlib.decompress(row[0])
+        except (sqlite3.Error, zlib.error):
+            self._count("errors")
+            return None
+        self._count("hits")
+        return content
+
+    def set(self, key: str, endpoint: str, content: bytes) -> None:
+        """
+        Store a response, evicting old entries if the cache grows past `max_bytes`.
+
+        Args:
+            key (str): The cache key.
+            endpoint (str): The API endpoint the response came from.
+            content (bytes): The response body.
+        """
+        family = endpoint_family(endpoint)
+        now = time.time()
+        payload = zlib.compress(content, self.compression_level)
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, family, expires, accessed, size, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, family, now + self.ttls.get(family, self.default_ttl), now, len(payload), payload),
+                )
+            self._count("writes")
+            self.evict()
+        except sqlite3.Error:
+            self._count("errors")
+
+    def evict(self) -> int:
+        """
+        Remove expired responses, then least recently used ones until the cache fits in `max_bytes`.
+
+        Returns:
+            int: The number of evicted responses.
+        """
+        with self._connection() as connection:
+            (total,) = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if total <= self.max_bytes:
+                return 0
+            evicted = connection.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),)).rowcount
+            (total,) = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        self._count("evictions", evicted)
+        return evicted
+
+    def invalidate(self, family: str) -> int:
+        """
+        Remove every cached response of an endpoint family, e.g. after a write to it.
+
+        Args:
+            family (str): The endpoint family, e.g. `target-lists`.
+
+        Returns:
+            int: The number of removed responses.
+        """
+        try:
+            with self._connection() as connection:
+                removed = connection.execute("DELETE FROM responses WHERE family = ?", (family,)).rowcount
+        except sqlite3.Error:
+            self._count("errors")
+            return 0
+        self._count("invalidations", removed)
+        return removed
+
+    def clear(self) -> None:
+        """
+        Remove every cached response.
+        """
+        with self._connection() as connection:
+            connection.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        """
+        Close this thread's connection.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    @property
+    def metrics(self) -> Dict:
+        """
+        Get the cache metrics.
+
+        Returns:
+            Dict: Hits, misses, writes, evictions, invalidations and errors of this process.
+        """
+        with self._lock:
+            return dict(self.counters)
@@ -0,0 +1,326 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+
+from .export import decode_page, encode_records
+from .main import Firewalla
+from .transport import Http2Transport
+
+# Columns written to CSV when `--fields` isn't given
+DEFAULT_FIELDS: Dict[str, List[str]] = {
+    "flows": [
+        "ts", "gid", "protocol", "direction", "block", "blockType", "download", "upload", "duration", "count",
+        "category", "region", "device.id", "device.name", "device.ip", "source.ip", "source.port",
+        "destination.name", "destination.ip", "destination.port",
+    ],
+    "alarms": [
+        "aid", "gid", "type", "ts", "message", "direction", "protocol", "alarmStatus",
+        "device.id", "device.name", "device.ip", "remote.name", "remote.ip", "remote.port",
+    ],
+    "devices": [
+        "id", "gid", "name", "ip", "macVendor", "online", "lastSeen", "ipReserved",
+        "network.id", "network.name", "group.id", "group.name", "totalDownload", "totalUpload",
+    ],
+}
+
+
+class Progress:
+    '''
+    Progress line
+    Rewrites one stderr line with the records and bytes exported so far and their rates
+    '''
+
+    def __init__(self, label: str, stream: Optional[TextIO] = None, interval: float = 0.5):
+        """
+        Initialize the progress line.
+
+        Args:
+            label (str): The name of the export.
+            stream (TextIO, optional): The stream to write to. Defaults to None (no output).
+            interval (float, optional): The minimum number of seconds between updates. Defaults to 0.5 seconds.
+        """
+        self.label: str = label
+        self.stream: Optional[TextIO] = stream
+        self.interval: float = interval
+        self.records: int = 0
+        self.bytes: int = 0
+        self.started: float = time.monotonic()
+        self._shown: float = 0.0
+
+    def line(self) -> str:
+        """
+        Format the progress line.
+
+        Returns:
+            str: The records and bytes so far, and their rates per second.
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"{self.label}: {self.records:,} records, {self.bytes / 1e6:,.1f} MB in {elapsed:,.1f}s "
+            f"({self.records / elapsed:,.0f} records/s, {self.bytes / elapsed / 1e6:,.2f} MB/s)"
+        )
+
+    def update(self, records: int, size: int) -> None:
+        """
+        Add exported records and bytes, redrawing the line at most every `interval` seconds.
+
+        Args:
+            records (int): The number of records written.
+            size (int): The number of response bytes they came from.
+        """
+        self.records += records
+        self.bytes += size
+        now = time.monotonic()
+        if self.stream is not None and now - self._shown >= self.interval:
+            self._shown = now
+            self.stream.write(f"\r\033[K{self.line()}")
+            self.stream.flush()
+
+    def finish(self) -> None:
+        """
+        Draw the final line.
+        """
+        if self.stream is not None:
+            self.stream.write(f"\r\033[K{self.line()}\n")
+            self.stream.flush()
+
+
+class RecordWriter:
+    '''
+    Record writer
+    Writes records, or batches the export workers already encoded, to a binary stream as NDJSON or CSV
+    '''
+
+    def __init__(self, stream: BinaryIO, format: str, fields: Optional[Sequence[str]], header: bool = True):
+        """
+        Initialize the writer.
+
+        Args:
+            stream (BinaryIO): The output stream.
+            format (str): `ndjson` or `csv`.
+            fields (Sequence[str], optional): The projected fields, in the order records hold them.
+                                              None when records are whole dicts (NDJSON only).
+            header (bool, optional): Write the CSV header row. Defaults to True.
+        """
+        self.stream: BinaryIO = stream
+        self.format: str = format
+        self.fields: Optional[Sequence[str]] = fields
+        if format == "csv" and header:
+            self.stream.write(encode_records([fields], "csv"))
+
+    def write(self, batch: Union[List[Any], bytes]) -> None:
+        """
+        Write a batch: encoded bytes, or records as dicts or tuples ordered like `fields`.
+
+        Args:
+            batch (Union[List[Any], bytes]): The batch.
+        """
+        if not isinstance(batch, bytes):
+            batch = encode_records(batch, self.format, self.fields)
+        self.stream.write(batch)
+        self.stream.flush()
+
+
+def load_state(path: Optional[str]) -> Dict:
+    """
+    Read a state file.
+
+    Args:
+        path (str, optional): The state file.
+
+    Returns:
+        Dict: The saved state, empty if there is no state file yet.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_state(path: Optional[str], state: Dict) -> None:
+    """
+    Write a state file, replacing the old one atomically so an interrupted export never leaves it half written.
+
+    Args:
+        path (str, optional): The state file. Nothing is written when None.
+        state (Dict): The state to save.
+    """
+    if not path:
+        return
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(state, file)
+    os.replace(temporary, path)
+
+
+def export_batches(client: Firewalla, args: argparse.Namespace, fields: Optional[List[str]],
+                   cursor: Optional[str]) -> Iterator[Tuple[Union[List[Any], bytes], Optional[str], int, int]]:
+    """
+    Fetch the records of an export.
+
+    Args:
+        client (Firewalla): The client.
+        args (argparse.Namespace): The parsed arguments.
+        fields (List[str], optional): The fields to project records onto.
+        cursor (str, optional): The cursor to resume from.
+
+    Yields:
+        Tuple[Union[List[Any], bytes], Optional[str], int, int]: A batch of records or of encoded output,
+                                                                 the cursor to resume after it, the number of
+                                                                 records and the number of response bytes it took.
+    """
+    if args.endpoint == "devices":
+        content = client.get_raw("devices", params={"box": args.box, "group": args.group}, timeout=args.timeout)
+        records = decode_page(content, fields)
+        yield records, None, len(records), len(content)
+        return
+    params: Dict = {"cursor": cursor}
+    if args.query is not None:
+        params["query"] = args.query
+    if args.limit is not None:
+        params["limit"] = args.limit
+    pipeline = client.export(
+        args.endpoint,
+        params=params,
+        fields=fields,
+        workers=args.concurrency,
+        prefetch=args.prefetch,
+        max_pages=args.max_pages,
+        timeout=args.timeout,
+        rate_limit=args.rate_limit,
+        # Workers encode the output, so records never pass through this process
+        encoding=args.format,
+    )
+    fetched = exported = 0
+    for batch, next_cursor in pipeline.batches():
+        yield batch, next_cursor, pipeline.records_exported - exported, pipeline.bytes_fetched - fetched
+        fetched, exported = pipeline.bytes_fetched, pipeline.records_exported
+
+
+def run_export(args: argparse.Namespace, client: Firewalla, stdout: TextIO, stderr: TextIO) -> int:
+    """
+    Run the `export` command.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        client (Firewalla): The client.
+        stdout (TextIO): Where records go when no output file is given.
+        stderr (TextIO): Where progress and errors go.
+
+    Returns:
+        int: The exit status.
+    """
+    state = load_state(args.state_file)
+    if state.get("endpoint", args.endpoint) != args.endpoint:
+        stderr.write(f"State file {args.state_file} belongs to a {state['endpoint']} export\n")
+        return 2
+    if state.get("complete") and args.cursor is None:
+        stderr.write(f"Export already complete according to {args.state_file}\n")
+        return 0
+    cursor = args.cursor if args.cursor is not None else state.get("cursor")
+    resuming = cursor is not None
+    records = state.get("records", 0) if resuming else 0
+
+    fields = args.fields.split(",") if args.fields else None
+    if fields is None and args.format == "csv":
+        fields = DEFAULT_FIELDS[args.endpoint]
+
+    to_file = args.output not in (None, "-")
+    header = True
+    if to_file:
+        # Resumed exports append to what the interrupted run wrote
+        header = not (resuming and os.path.exists(args.output) and os.path.getsize(args.output) > 0)
+        output = open(args.output, "ab" if resuming else "wb")
+    else:
+        stdout.flush()
+        output = stdout.buffer
+    show_progress = args.progress if args.progress is not None else stderr.isatty()
+    progress = Progress(args.endpoint, stderr if show_progress else None)
+    writer = RecordWriter(output, args.format, fields, header=header)
+    try:
+        for batch, next_cursor, count, size in export_batches(client, args, fields, cursor):
+            writer.write(batch)
+            records += count
+            progress.update(count, size)
+            save_state(args.state_file, {
+                "endpoint": args.endpoint, "cursor": next_cursor, "records": records, "complete": next_cursor is None,
+            })
+    except KeyboardInterrupt:
+        progress.finish()
+        stderr.write("Interrupted" + (f", resume with --state-file {args.state_file}\n" if args.state_file else "\n"))
+        return 130
+    except Exception as err:
+        progress.finish()
+        stderr.write(f"Export failed: {err}\n")
+        return 1
+    finally:
+        if to_file:
+            output.close()
+    progress.finish()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command-line parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser of the `firewalla` command.
+    """
+    parser = argparse.ArgumentParser(prog="firewalla", description="Firewalla MSP API command-line tools.")
+    parser.add_argument("--api-key", default=os.environ.get("FIREWALLA_API_KEY"),
+                        help="API key (default: $FIREWALLA_API_KEY)")
+    parser.add_argument("--subdomain", default=os.environ.get("FIREWALLA_MSP_SUBDOMAIN"),
+                        help="MSP subdomain, e.g. `mycompany` for mycompany.firewalla.net (default: $FIREWALLA_MSP_SUBDOMAIN)")
+    parser.add_argument("--http2", action="store_true", help="send requests over HTTP/2 (requires httpx[http2])")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="stream flows, alarms or devices as NDJSON or CSV")
+    export.add_argument("endpoint", choices=["flows", "alarms", "devices"])
+    export.add_argument("-o", "--output", help="output file (default: stdout)")
+    export.add_argument("-f", "--format", choices=["ndjson", "csv"], default="ndjson", help="output format (default: ndjson)")
+    export.add_argument("--fields", help="comma-separated dotted fields to keep, e.g. ts,device.name")
+    export.add_argument("-q", "--query", help="flow or alarm query")
+    export.add_argument("--limit", type=int, help="records per page")
+    export.add_argument("--box", help="box to export devices of")
+    export.add_argument("--group", help="box group to export devices of")
+    export.add_argument("--concurrency", type=int, default=None, help="page decode processes (default: number of CPUs)")
+    export.add_argument("--prefetch", type=int, default=4, help="pages fetched ahead of the writer (default: 4)")
+    export.add_argument("--cursor", help="resume from this cursor")
+    export.add_argument("--state-file", help="save the cursor after every page, and resume from it when it exists")
+    export.add_argument("--rate-limit", type=float, help="maximum pages requested per second")
+    export.add_argument("--max-pages", type=int, help="stop after this many pages")
+    export.add_argument("--timeout", type=int, default=30, help="request timeout in seconds (default: 30)")
+    export.add_argument("--progress", action=argparse.BooleanOptionalAction, default=None,
+                        help="show a progress line on stderr (default: when stderr is a terminal)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the `firewalla` command.
+
+    Args:
+        argv (List[str], optional): The arguments. Defaults to None (`sys.argv`).
+
+    Returns:
+        int: The exit status.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.api_key or not args.subdomain:
+        parser.error("an API key and MSP subdomain are required (--api-key/--subdomain or FIREWALLA_API_KEY/FIREWALLA_MSP_SUBDOMAIN)")
+    transport = Http2Transport() if args.http2 else None
+    client = Firewalla(args.api_key, args.subdomain, transport=transport)
+    stdout = sys.stdout
+    try:
+        # The client prints queries; keep them out of records written to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            return run_export(args, client, stdout, sys.stderr)
+    finally:
+        if transport is not None:
+            transport.close()
@@ -0,0 +1,270 @@
+import threading
+import time
+from collections.abc import Mapping
+from typing import Dict, List, Iterable, Iterator, Optional, Tuple, Union, TYPE_CHECKING
+from .matcher import TargetListMatcher
+from .models import Model
+
+if TYPE_CHECKING:
+    from .main import Firewalla
+
+# Flow fields that may carry the remote host, checked in order.
+DESTINATION_FIELDS: Tuple[str, ...] = ("name", "domain", "ip")
+
+# Default of `enrich_flow`: join against the cached tables, loading them if needed.
+CURRENT_TABLES = object()
+
+
+class SideTables:
+    '''
+    Snapshot of the locally cached boxes, devices and target lists,
+    indexed by the keys flows are joined on.
+    '''
+
+    __slots__ = ("boxes", "devices_by_mac", "devices_by_ip", "matcher", "list_versions", "loaded_at")
+
+    def __init__(
+        self,
+        boxes: List[Dict],
+        devices: List[Dict],
+        target_lists: List[Dict],
+        previous: Optional["SideTables"] = None,
+    ):
+        """
+        Build the hash indexes for a set of side tables.
+
+        Args:
+            boxes (List[Dict]): The boxes as returned by `get_boxes`.
+            devices (List[Dict]): The devices as returned by `get_devices`.
+            target_lists (List[Dict]): The target lists as returned by `get_target_lists`.
+            previous (SideTables, optional): The tables being replaced. Their target list matcher is carried
+                                             forward and only lists whose `lastUpdated` or targets changed
+                                             are reloaded into it, so `previous` sees them too.
+                                             Defaults to None (build a new matcher).
+        """
+        self.boxes: Dict[str, Dict] = {box.get("gid"): box for box in boxes}
+        self.devices_by_mac: Dict[Tuple[str, str], Dict] = {}
+        self.devices_by_ip: Dict[Tuple[str, str], Dict] = {}
+        for device in devices:
+            gid = device.get("gid")
+            if device.get("id"):
+                self.devices_by_mac[(gid, str(device["id"]).upper())] = device
+            if device.get("ip"):
+                self.devices_by_ip[(gid, device["ip"])] = device
+        self.matcher: TargetListMatcher = previous.matcher if previous is not None else TargetListMatcher()
+        loaded = previous.list_versions if previous is not None else {}
+        self.list_versions: Dict[str, Tuple] = {}
+        for target_list in target_lists:
+            list_id = target_list["id"]
+            version = (target_list.get("lastUpdated"), target_list.get("targets") or [])
+            self.list_versions[list_id] = version
+            if loaded.get(list_id) != version:
+                self.matcher.update_list(target_list)
+        for list_id in loaded.keys() - self.list_versions.keys():
+            self.matcher.remove_list(list_id)
+        self.loaded_at: float = time.monotonic()
+
+    def match_targets(self, host: str) -> List[str]:
+        """
+        Look up the target lists containing a host.
+
+        Args:
+            host (str): The domain or IP address to look up.
+
+        Returns:
+            List[str]: The IDs of the target lists covering the host, sorted.
+        """
+        return sorted(self.matcher.match(host))
+
+
+class FlowEnricher:
+    '''
+    Flow enrichment stage
+    Joins flow records with cached box, device and target list data
+    '''
+
+    def __init__(self, client: "Firewalla", ttl: float = 300.0, group: Optional[str] = None, retry_delay: float = 30.0):
+        """
+        Initialize the flow enricher.
+
+        Args:
+            client (Firewalla): The client used to load the side tables.
+            ttl (float, optional): Seconds before the side tables are refreshed. Defaults to 300 seconds.
+            group (str, optional): The group to restrict boxes and devices to. Defaults to None.
+            retry_delay (float, optional): Seconds to wait after a failed load before trying again. Defaults to 30 seconds.
+        """
+        self.client = client
+        self.ttl: float = ttl
+        self.group: Optional[str] = group
+        self.tables: Optional[SideTables] = None
+        self.retry_delay: float = retry_delay
+        self.last_error: Optional[str] = None
+        self.failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._refreshing: bool = False
+
+    def refresh(self) -> SideTables:
+        """
+        Reload the side tables from the API and swap them in.
+
+        If any of the requests fail, the previous tables are kept and the error
+        is stored in `last_error`.
+
+        Returns:
+            SideTables: The tables in use after the refresh.
+        """
+        try:
+            boxes = self.client.get_boxes(group=self.group)
+            devices = self.client.get_devices(group=self.group)
+            target_lists = self.client.get_target_lists()
+            for result in (boxes, devices, target_lists):
+                if isinstance(result, dict) and "error" in result:
+                    self.last_error = result["error"]
+                    self.failed_at = time.monotonic()
+                    break
+            else:
+                self.tables = self._build_tables(
+                    _results(boxes), _results(devices), _results(target_lists)
+                )
+                self.last_error = None
+                self.failed_at = None
+        except Exception as err:
+            self.last_error = str(err)
+            self.failed_at = time.monotonic()
+            raise
+        finally:
+            with self._lock:
+                self._refreshing = False
+        return self.tables
+
+    def _build_tables(self, boxes: List[Dict], devices: List[Dict], target_lists: List[Dict]) -> SideTables:
+        # Reloading every list would hold the GIL for seconds on large lists and stall the flow stream
+        return SideTables(boxes, devices, target_lists, previous=self.tables)
+
+    def _current_tables(self) -> Optional[SideTables]:
+        """
+        Return the tables to join against, starting a background refresh when they are stale.
+
+        Only the very first load blocks; afterwards stale tables keep being used
+        until the background refresh swaps in the new ones. After a failed load,
+        no new load starts for `retry_delay` seconds.
+        """
+        tables = self.tables
+        now = time.monotonic()
+        if self.failed_at is not None and now - self.failed_at < self.retry_delay:
+            return tables
+        if tables is None:
+            with self._lock:
+                if self._refreshing:
+                    return None
+                self._refreshing = True
+            return self.refresh()
+        if now - tables.loaded_at >= self.ttl:
+            with self._lock:
+                if self._refreshing:
+                    return tables
+                self._refreshing = True
+            threading.Thread(target=self.refresh, daemon=True).start()
+        return tables
+
+    def enrich_flow(self, flow: Dict, tables: Optional[SideTables] = CURRENT_TABLES) -> Dict:
+        """
+        Enrich a single flow.
+
+        Args:
+            flow (Dict): The flow record.
+            tables (SideTables, optional): The tables to join against, or None when none could be loaded.
+                                           Defaults to the cached tables.
+
+        Returns:
+            Dict: A shallow copy of the flow with an added `enrichment` field.
+        """
+        if tables is CURRENT_TABLES:
+            tables = self._current_tables()
+        # Response models are converted back to plain records
+        enriched = flow.to_dict() if isinstance(flow, Model) else dict(flow)
+        if tables is None:
+            enriched["enrichment"] = None
+            return enriched
+
+        gid = flow.get("gid")
+        box = tables.boxes.get(gid)
+        group = box.get("group") if box else None
+        device_ref = flow.get("device") or {}
+        device = None
+        if device_ref.get("id"):
+            device = tables.devices_by_mac.get((gid, str(device_ref["id"]).upper()))
+        if device is None and device_ref.get("ip"):
+            device = tables.devices_by_ip.get((gid, device_ref["ip"]))
+
+        destination = flow.get("destination") or {}
+        lists: List[str] = []
+        for field in DESTINATION_FIELDS:
+            host = destination.get(field)
+            if host:
+                for list_id in tables.match_targets(str(host)):
+                    if list_id not in lists:
+                        lists.append(list_id)
+
+        enriched["enrichment"] = {
+            "boxName": box.get("name") if box else None,
+            "boxGroup": group.get("name") if isinstance(group, Mapping) else group,
+            "deviceName": device.get("name") if device else device_ref.get("name"),
+            "targetLists": lists,
+        }
+        return enriched
+
+    def enrich_batch(self, flows: List[Dict]) -> List[Dict]:
+        """
+        Enrich a batch of flows against a single snapshot of the side tables.
+
+        Args:
+            flows (List[Dict]): The flow records.
+
+        Returns:
+            List[Dict]: The enriched flows, in the same order.
+        """
+        tables = self._current_tables()
+        enrich_flow = self.enrich_flow
+        return [enrich_flow(flow, tables) for flow in flows]
+
+    def enrich(self, flows: Iterable[Union[Dict, List[Dict]]]) -> Iterator[Dict]:
+        """
+        Wrap a stream of flows or flow pages and yield enriched flows.
+
+        Args:
+            flows (Iterable): Flow records, lists of flow records or `get_flows` responses.
+
+        Yields:
+            Dict: The enriched flows.
+        """
+        for item in flows:
+            if isinstance(item, Mapping) and "results" not in item:
+                yield self.enrich_flow(item)
+            else:
+                yield from self.enrich_batch(_results(item))
+
+    def enrich_page(self, page: Union[Dict, List]) -> Union[Dict, List]:
+        """
+        Enrich a `get_flows` response, keeping its shape.
+
+        Args:
+            page (Union[Dict, List]): The response from `get_flows`.
+
+        Returns:
+            Union[Dict, List]: The response with its flows enriched. Error responses are returned unchanged.
+        """
+        if isinstance(page, list):
+            return self.enrich_batch(page)
+        if "error" in page or "results" not in page:
+            return page
+        return {**page, "results": self.enrich_batch(page["results"])}
+
+
+def _results(response: Union[Dict, List]) -> List[Dict]:
+    """
+    Extract the records from a list or paginated API response.
+    """
+    if isinstance(response, list):
+        return response
+    return response.get("results") or []
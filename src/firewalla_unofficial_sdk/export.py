@@ -0,0 +1,313 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Sequence, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .main import Firewalla
+
+ExportEndpoint = Literal["flows", "alarms"]
+OutputFormat = Literal["ndjson", "csv"]
+RecordFilter = Callable[[Dict], bool]
+Transform = Callable[[List[Any]], List[Any]]
+
+CURSOR_KEY = b'"next_cursor"'
+_DONE = object()
+
+
+def find_cursor(content: bytes) -> Optional[str]:
+    """
+    Extract `next_cursor` from a raw page without decoding the whole page.
+
+    Args:
+        content (bytes): The raw page.
+
+    Returns:
+        Optional[str]: The cursor of the next page, or None on the last page.
+    """
+    index = content.rfind(CURSOR_KEY)
+    if index < 0:
+        return None
+    colon = content.index(b":", index + len(CURSOR_KEY))
+    value, _ = json.JSONDecoder().raw_decode(content[colon + 1:colon + 1024].decode(errors="replace").lstrip())
+    return value or None
+
+
+def _field(record: Dict, path: Sequence[str]) -> Any:
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def decode_page(
+    content: Union[bytes, str],
+    fields: Optional[Sequence[str]] = None,
+    record_filter: Optional[RecordFilter] = None,
+    transform: Optional[Transform] = None,
+) -> List[Any]:
+    """
+    Decode, filter and transform a raw page.
+
+    Args:
+        content (Union[bytes, str]): The raw page.
+        fields (Sequence[str], optional): Dotted field paths to project each record onto, e.g. `device.name`.
+                                          Records become tuples in that order. Defaults to None (keep dicts).
+        record_filter (RecordFilter, optional): Keep only the records it returns True for. Defaults to None.
+        transform (Transform, optional): Applied to the page's records last. Defaults to None.
+
+    Returns:
+        List[Any]: The page's records.
+    """
+    page = json.loads(content)
+    records = page if isinstance(page, list) else page.get("results") or []
+    if record_filter is not None:
+        records = [record for record in records if record_filter(record)]
+    if fields is not None:
+        paths = [field.split(".") for field in fields]
+        records = [tuple(_field(record, path) for path in paths) for record in records]
+    if transform is not None:
+        records = transform(records)
+    return records
+
+
+def encode_records(records: List[Any], format: OutputFormat, fields: Optional[Sequence[str]] = None) -> bytes:
+    """
+    Encode records as NDJSON lines or CSV rows.
+
+    Args:
+        records (List[Any]): Dicts, or tuples ordered like `fields`.
+        format (OutputFormat): `ndjson` or `csv`. CSV needs tuples.
+        fields (Sequence[str], optional): The projected fields, used as NDJSON keys of tuple records. Defaults to None.
+
+    Returns:
+        bytes: The UTF-8 encoded lines.
+    """
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        return buffer.getvalue().encode()
+    if fields is not None:
+        records = [dict(zip(fields, record)) for record in records]
+    return "".join(json.dumps(record, separators=(",", ":"), default=str) + "\n" for record in records).encode()
+
+
+def _decode_shared(
+    name: str, size: int, fields, record_filter, transform, encoding: Optional[OutputFormat]
+) -> Tuple[int, Union[int, bytes]]:
+    """
+    Decode a page the parent process placed in shared memory, and write the batch back into the same block.
+
+    Returns the number of records and the size of the batch in the block, or the batch itself when it
+    doesn't fit there: encoded bytes, or the pickled records when no encoding is set.
+    """
+    shared = SharedMemory(name=name, track=False)
+    try:
+        # Decode the text straight out of the block rather than copying the page into bytes first
+        records = decode_page(str(shared.buf[:size], "utf-8"), fields, record_filter, transform)
+        if encoding is not None:
+            batch = encode_records(records, encoding, fields)
+        else:
+            batch = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(batch) > shared.size:
+            return len(records), batch
+        shared.buf[:len(batch)] = batch
+        return len(records), len(batch)
+    finally:
+        shared.close()
+
+
+class ExportPipeline:
+    '''
+    Export pipeline
+    Fetches raw pages on an I/O thread and decodes them in a process pool, preserving page order.
+    Pages go to the workers and batches come back through shared memory; with an `encoding`,
+    batches are already encoded output so the parent process doesn't touch individual records.
+    '''
+
+    def __init__(
+        self,
+        client: "Firewalla",
+        endpoint: ExportEndpoint,
+        params: Optional[Dict] = None,
+        fields: Optional[Sequence[str]] = None,
+        record_filter: Optional[RecordFilter] = None,
+        transform: Optional[Transform] = None,
+        workers: Optional[int] = None,
+        prefetch: int = 4,
+        max_pages: Optional[int] = None,
+        timeout: int = 30,
+        rate_limit: Optional[float] = None,
+        mp_context: Any = None,
+        encoding: Optional[OutputFormat] = None,
+    ):
+        """
+        Initialize the export pipeline.
+
+        Args:
+            client (Firewalla): The client used to fetch pages.
+            endpoint (ExportEndpoint): `flows` or `alarms`.
+            params (Dict, optional): The query parameters of the first page, e.g. `query`, `limit` and `cursor`.
+                                     Defaults to None.
+            fields (Sequence[str], optional): Dotted field paths to project records onto. Defaults to None.
+            record_filter (RecordFilter, optional): Keep only the records it returns True for. Must be picklable,
+                                                    e.g. a module-level function. Defaults to None.
+            transform (Transform, optional): Applied to each page's records in the worker. Must be picklable. Defaults to None.
+            workers (int, optional): The number of decode processes. Defaults to the number of CPUs.
+            prefetch (int, optional): The number of pages fetched or decoding ahead of the consumer. Defaults to 4.
+            max_pages (int, optional): Stop after this many pages. Defaults to None (all pages).
+            timeout (int, optional): The request timeout in seconds. Defaults to 30 seconds.
+            rate_limit (float, optional): The maximum number of pages requested per second. Defaults to None (no limit).
+            mp_context (optional): The multiprocessing context of the pool. Defaults to `forkserver` where available,
+                                  since forking while the I/O thread runs is unsafe.
+            encoding (OutputFormat, optional): Encode batches as `ndjson` lines or `csv` rows in the workers.
+                                               Batches are then bytes rather than record lists. CSV needs `fields`.
+                                               Defaults to None (record lists).
+        """
+        self.client = client
+        self.endpoint: ExportEndpoint = endpoint
+        self.params: Dict = dict(params or {})
+        self.fields: Optional[Sequence[str]] = fields
+        self.record_filter: Optional[RecordFilter] = record_filter
+        self.transform: Optional[Transform] = transform
+        self.workers: int = workers or os.cpu_count() or 1
+        self.prefetch: int = prefetch
+        self.max_pages: Optional[int] = max_pages
+        self.timeout: int = timeout
+        self.rate_limit: Optional[float] = rate_limit
+        if mp_context is None and "forkserver" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("forkserver")
+        self.mp_context = mp_context
+        self.encoding: Optional[OutputFormat] = encoding
+        self.cursor: Optional[str] = self.params.get("cursor")
+        self.pages_fetched: int = 0
+        self.bytes_fetched: int = 0
+        self.records_exported: int = 0
+        self._stop = threading.Event()
+
+    def fetch_page(self, cursor: Optional[str]) -> bytes:
+        """
+        Fetch one raw page.
+
+        Args:
+            cursor (Optional[str]): The cursor of the page, None for the first page.
+
+        Returns:
+            bytes: The raw page.
+        """
+        return self.client.get_raw(self.endpoint, params={**self.params, "cursor": cursor}, timeout=self.timeout)
+
+    def _fetch_pages(self, pages: "queue.Queue") -> None:
+        """
+        Fetch pages in order until the last one, handing raw pages and their cursors to the consumer.
+        """
+        cursor = self.cursor
+        fetched = 0
+        next_request = time.monotonic()
+        try:
+            while not self._stop.is_set() and (self.max_pages is None or fetched < self.max_pages):
+                if self.rate_limit:
+                    # Wait for the next request slot, waking early if the consumer stops
+                    if self._stop.wait(max(next_request - time.monotonic(), 0)):
+                        break
+                    next_request = max(next_request, time.monotonic()) + 1 / self.rate_limit
+                content = self.fetch_page(cursor)
+                fetched += 1
+                cursor = find_cursor(content)
+                pages.put((content, cursor))
+                if cursor is None:
+                    break
+        except Exception as err:
+            pages.put(err)
+            return
+        pages.put(_DONE)
+
+    def batches(self) -> Iterator[Tuple[Union[List[Any], bytes], Optional[str]]]:
+        """
+        Yield decoded pages in order.
+
+        Yields:
+            Tuple[Union[List[Any], bytes], Optional[str]]: The page's records, or their encoded output with an
+                                                           `encoding`, and the cursor to resume after it.
+        """
+        pages: "queue.Queue" = queue.Queue(maxsize=self.prefetch)
+        self._stop.clear()
+        fetcher = threading.Thread(target=self._fetch_pages, args=(pages,), name="firewalla-export-io", daemon=True)
+        fetcher.start()
+        pending: "deque[Tuple[Future, SharedMemory, Optional[str]]]" = deque()
+
+        def complete() -> Tuple[Union[List[Any], bytes], Optional[str]]:
+            future, shared, cursor = pending.popleft()
+            try:
+                count, batch = future.result()
+                if isinstance(batch, int):
+                    view = shared.buf[:batch]
+                    try:
+                        batch = bytes(view) if self.encoding is not None else pickle.loads(view)
+                    finally:
+                        view.release()
+                elif self.encoding is None:
+                    batch = pickle.loads(batch)
+                self.records_exported += count
+                return batch, cursor
+            finally:
+                shared.close()
+                shared.unlink()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=self.mp_context) as pool:
+                while True:
+                    item = pages.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    content, cursor = item
+                    self.pages_fetched += 1
+                    self.bytes_fetched += len(content)
+                    # Hand the page over through shared memory rather than pickling it down the pipe
+                    shared = SharedMemory(create=True, size=max(len(content), 1))
+                    shared.buf[:len(content)] = content
+                    future = pool.submit(
+                        _decode_shared, shared.name, len(content),
+                        self.fields, self.record_filter, self.transform, self.encoding,
+                    )
+                    pending.append((future, shared, cursor))
+                    while len(pending) > self.prefetch or (pending and pending[0][0].done()):
+                        records, self.cursor = complete()
+                        yield records, self.cursor
+                while pending:
+                    records, self.cursor = complete()
+                    yield records, self.cursor
+        finally:
+            self._stop.set()
+            # Unblock the fetcher if it is waiting on a full queue
+            while fetcher.is_alive():
+                try:
+                    pages.get_nowait()
+                except queue.Empty:
+                    fetcher.join(0.1)
+            for future, shared, _ in pending:
+                future.cancel()
+                shared.close()
+                shared.unlink()
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Yield the exported records in order, or encoded batches when an `encoding` is set.
+        """
+        for batch, _ in self.batches():
+            if self.encoding is not None:
+                yield batch
+            else:
+                yield from batch
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class HedgePolicy:
+    '''
+    Hedged request policy
+    Sends a duplicate of a slow idempotent request and uses whichever response arrives first
+    '''
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 0.95,
+        initial_delay: float = 1.0,
+        min_delay: float = 0.05,
+        min_samples: int = 20,
+        window: int = 500,
+        max_hedge_ratio: float = 0.1,
+        max_workers: int = 32,
+    ):
+        """
+        Initialize the hedging policy.
+
+        Args:
+            delay (float, optional): Fixed seconds to wait before hedging. Defaults to None, which tracks
+                                     the `percentile` latency of recent requests instead.
+            percentile (float, optional): The latency percentile used as the hedge delay. Defaults to 0.95.
+            initial_delay (float, optional): The hedge delay used until `min_samples` latencies are recorded. Defaults to 1 second.
+            min_delay (float, optional): The lower bound of the tracked hedge delay. Defaults to 0.05 seconds.
+            min_samples (int, optional): The number of latencies needed before the percentile is used. Defaults to 20.
+            window (int, optional): The number of recent latencies tracked. Defaults to 500.
+            max_hedge_ratio (float, optional): The maximum share of requests that may be hedged,
+                                               capping the extra load. Defaults to 0.1.
+            max_workers (int, optional): The number of threads sending requests. Defaults to 32.
+        """
+        self.delay: Optional[float] = delay
+        self.percentile: float = percentile
+        self.initial_delay: float = initial_delay
+        self.min_delay: float = min_delay
+        self.min_samples: int = min_samples
+        self.max_hedge_ratio: float = max_hedge_ratio
+        self.latencies: deque = deque(maxlen=window)
+        self.counters: Dict[str, int] = {
+            "requests": 0,
+            "hedges_fired": 0,
+            "hedges_won": 0,
+            "hedges_skipped": 0,
+        }
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firewalla-hedge")
+
+    def hedge_delay(self) -> float:
+        """
+        Get the number of seconds to wait before sending a hedge.
+
+        Returns:
+            float: The fixed delay, or the tracked latency percentile once enough samples exist.
+        """
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay
+            latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile))
+        return max(latencies[index], self.min_delay)
+
+    def _allow_hedge(self) -> bool:
+        with self._lock:
+            if self.counters["hedges_fired"] + 1 > self.counters["requests"] * self.max_hedge_ratio:
+                self.counters["hedges_skipped"] += 1
+                return False
+            self.counters["hedges_fired"] += 1
+            return True
+
+    def _timed(self, send: Callable[[], T]) -> T:
+        start = time.monotonic()
+        result = send()
+        with self._lock:
+            self.latencies.append(time.monotonic() - start)
+        return result
+
+    def execute(self, send: Callable[[], T]) -> T:
+        """
+        Run a request, hedging it if it has not completed after the hedge delay.
+
+        Python threads cannot be interrupted, so a losing request that is already
+        in flight is left to finish in the background and its response is closed.
+
+        Args:
+            send (Callable[[], T]): Sends the request and returns the response.
+
+        Returns:
+            T: The first successful response. If every attempt fails, the primary's exception is raised.
+        """
+        with self._lock:
+            self.counters["requests"] += 1
+        primary = self._executor.submit(self._timed, send)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done or not self._allow_hedge():
+            return primary.result()
+
+        hedge = self._executor.submit(self._timed, send)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        _discard(loser)
+                    if future is hedge:
+                        with self._lock:
+                            self.counters["hedges_won"] += 1
+                    return future.result()
+        return primary.result()
+
+    @property
+    def metrics(self) -> Dict:
+        """
+        Get the hedging metrics.
+
+        Returns:
+            Dict: How many requests were made and how often hedges fired, won, or were skipped by the load cap,
+                  together with the current hedge delay.
+        """
+        with self._lock:
+            metrics: Dict = dict(self.counters)
+        metrics["hedge_delay"] = self.hedge_delay()
+        return metrics
+
+    def shutdown(self) -> None:
+        """
+        Stop the request threads once in-flight requests complete.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _discard(future: Future) -> None:
+    """
+    Cancel a losing request, or close its response once it completes.
+    """
+    if future.cancel():
+        return
+
+    def close(done: Future) -> None:
+        if done.exception() is None and hasattr(done.result(), "close"):
+            done.result().close()
+
+    future.add_done_callback(close)
@@ -1,8 +1,17 @@
 import json
+import time
 import base64
 import requests
 import urllib.parse
-from typing import Dict, Union, Literal, TypeAlias, List, Optional, TypedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Union, Literal, TypeAlias, List, Optional, TypedDict, Iterable, Tuple, get_args
+from .watch import AlarmWatcher, AlarmHandler
+from .hedging import HedgePolicy
+from .breaker import CircuitBreaker, CircuitBreakerRegistry, endpoint_family
+from .cache import DiskCache
+from .export import ExportPipeline, ExportEndpoint
+from .transport import Http2Transport
+from .models import Model, Box, Device, Alarm, Flow, TargetList, TrendPoint, decode
 
 EndpointTypes = Literal["pause", "resume"]
 FlowType: TypeAlias = Literal["topBoxesByBlockedFlows", "topBoxesBySecurityAlarms", "topRegionsByBlockedFlows"]
@@ -21,25 +30,60 @@ class AlarmParams(TypedDict):
     cursor: Optional[str]
 
 
+class SnapshotSection(TypedDict):
+    status: Literal["ok", "error", "timeout"]
+    data: Optional[Union[Dict, List]]
+    error: Optional[str]
+    elapsed: Optional[float]
+
+class Snapshot(TypedDict):
+    complete: bool
+    elapsed: float
+    sections: Dict[str, SnapshotSection]
+
+
 class Firewalla:
     '''
     Firewalla API client
     Simple interface to interact with the Firewalla API
     '''
     
-    def __init__(self, api_key: str, firewalla_msp_subdomain: str):
+    def __init__(
+        self,
+        api_key: str,
+        firewalla_msp_subdomain: str,
+        hedge_policy: Optional[HedgePolicy] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        cache: Optional[DiskCache] = None,
+        response_models: bool = False,
+        transport: Optional[Http2Transport] = None,
+    ):
         """
         Initialize the Firewalla SDK instance.
 
         Args:
             api_key (str): The API key for authenticating with the Firewalla service.
             firewalla_msp_subdomain (str): The subdomain for the Firewalla MSP.
+            hedge_policy (HedgePolicy, optional): Hedge slow GET requests with a duplicate request. Defaults to None.
+            circuit_breakers (CircuitBreakerRegistry, optional): Fail requests fast while their endpoint family
+                                                                 is failing. Defaults to None.
+            cache (DiskCache, optional): Serve GET responses of the cached endpoints from disk. Defaults to None.
+            response_models (bool, optional): Return records as typed models (`Box`, `Device`, `Alarm`, `Flow`,
+                                              `TargetList`, `TrendPoint`) instead of dicts. They take less
+                                              memory per record but longer to build. Defaults to False.
+            transport (Http2Transport, optional): Send requests over pooled HTTP/2 connections, so concurrent
+                                                  requests share a few connections. Defaults to None (`requests`).
         """
         self.api_key: str = api_key
         self.domain: str = f"https://{firewalla_msp_subdomain}.firewalla.net"
         self.api_version: str = "v2"
         self.url: str = None
         self.paginated_results: List[Dict] = []
+        self.hedge_policy: Optional[HedgePolicy] = hedge_policy
+        self.circuit_breakers: Optional[CircuitBreakerRegistry] = circuit_breakers
+        self.cache: Optional[DiskCache] = cache
+        self.response_models: bool = response_models
+        self.transport: Optional[Http2Transport] = transport
 
     def __get_headers(self) -> Dict[str, str]:
         """
@@ -53,6 +97,121 @@ class Firewalla:
             "Content-Type": "application/json"
         }
 
+    def __http(self):
+        """
+        Get what sends the requests: the configured transport, or the `requests` module.
+        """
+        return requests if self.transport is None else self.transport
+
+    def __decode(self, response: Union[Dict, List], model: type[Model]) -> Union[Dict, List, Model]:
+        """
+        Decode a response into models when `response_models` is enabled.
+
+        Args:
+            response (Union[Dict, List]): The response from the API.
+            model (type[Model]): The model of the records.
+
+        Returns:
+            Union[Dict, List, Model]: The decoded response, or the response unchanged if models are disabled.
+        """
+        if not self.response_models:
+            return response
+        return decode(response, model)
+
+    def __breaker(self, endpoint: str) -> Optional[CircuitBreaker]:
+        """
+        Get the circuit breaker for an endpoint, if circuit breakers are enabled.
+
+        Args:
+            endpoint (str): The API endpoint.
+
+        Returns:
+            Optional[CircuitBreaker]: The breaker of the endpoint family.
+        """
+        if self.circuit_breakers is None:
+            return None
+        return self.circuit_breakers.get(endpoint)
+
+    def __invalidate(self, endpoint: str) -> None:
+        """
+        Drop the cached responses of an endpoint's family after a request that may have changed it.
+
+        Args:
+            endpoint (str): The API endpoint written to.
+        """
+        if self.cache is not None and self.cache.cacheable(endpoint):
+            self.cache.invalidate(endpoint_family(endpoint))
+
+    def breaker_states(self) -> Dict[str, str]:
+        """
+        Get the circuit breaker state of each endpoint family used so far.
+
+        Returns:
+            Dict[str, str]: The state (`closed`, `open` or `half_open`) keyed by endpoint family.
+                            Empty when circuit breakers are disabled.
+        """
+        if self.circuit_breakers is None:
+            return {}
+        return self.circuit_breakers.states()
+
+    def __prepare_params(self, params: Optional[Dict]) -> Optional[Dict]:
+        """
+        Prepare the query parameters of a GET request.
+
+        Args:
+            params (Dict, optional): The query parameters.
+
+        Returns:
+            Optional[Dict]: A copy of the parameters with None replaced by empty strings,
+                            the query URL encoded and the cursor base64 decoded.
+        """
+        if params is None:
+            return None
+        # Replace None values with empty strings
+        params = {k: (v if v is not None else "") for k, v in params.items()}
+        # Add identifier to URL
+        # Parse query parameter
+        if "query" in params and params["query"]:
+            params["query"] = urllib.parse.quote_plus(str(params["query"]))
+            print(f"Query: {params["query"]}")
+        if "cursor" in params and params["cursor"]:
+            params["cursor"] = base64.b64decode(str(params["cursor"]))
+        return params
+
+    def get_raw(self, endpoint: str, params: Optional[Dict] = None, timeout: int = 10) -> bytes:
+        """
+        Send a GET request and return the undecoded response body.
+
+        Used by bulk exports that decode pages elsewhere. Unlike the other GET methods,
+        failures raise instead of returning an error dictionary, and the cache is bypassed.
+        The endpoint's circuit breaker applies as it does to the other GET methods.
+
+        Args:
+            endpoint (str): The API endpoint to send the GET request to.
+            params (Dict, optional): A dictionary of query parameters to include in the request. Defaults to None.
+            timeout (int, optional): The maximum number of seconds to wait for a response. Defaults to 10 seconds.
+
+        Returns:
+            bytes: The response body.
+        Raises:
+            RequestException: If the circuit breaker is open, the request failed or returned an unsuccessful status code.
+        """
+        url = f"{self.domain}/{self.api_version}/{endpoint}"
+        breaker = self.__breaker(endpoint)
+        if breaker is not None and not breaker.allow():
+            raise requests.exceptions.RequestException(f"Circuit breaker open for {breaker.name} endpoints")
+        failed = True
+        start = time.monotonic()
+        try:
+            response = self.__send_get(url, headers=self.__get_headers(), params=self.__prepare_params(params), timeout=timeout)
+            # Client errors are the caller's fault, not a sign the endpoint is failing
+            failed = response.status_code >= 500
+            response.raise_for_status()
+            return response.content
+        finally:
+            if breaker is not None:
+                breaker.record(not failed, time.monotonic() - start)
+
     def __get(self, endpoint: str, params: Optional[Dict] = None, timeout: int = 10) -> Union[Dict, List]:
         """
         Send a GET request to the specified endpoint.
@@ -67,24 +226,32 @@ class Firewalla:
                                it returns a list of all results. Otherwise, it returns the JSON response as a dictionary.
                                If the request fails, returns a dictionary containing an error message.
         """
-        self.url = f"{self.domain}/{self.api_version}/{endpoint}"
+        # Keep the URL local so concurrent requests on one client don't race on self.url
+        url = self.url = f"{self.domain}/{self.api_version}/{endpoint}"
         headers = self.__get_headers()
-    
-        if params is not None:
-            # Replace None values with empty strings
-            params = {k: (v if v is not None else "") for k, v in params.items()}
-            # Add identifier to URL
-            # Parse query parameter
-            if "query" in params and params["query"]:
-                params["query"] = urllib.parse.quote_plus(str(params["query"]))
-                print(f"Query: {params["query"]}")
-            if "cursor" in params and params["cursor"]:
-                params["cursor"] = base64.b64decode(str(params["cursor"]))
+        params = self.__prepare_params(params)
+
+        cache_key = None
+        if self.cache is not None and self.cache.cacheable(endpoint):
+            cache_key = self.cache.key(self.api_key, url, params)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return json.loads(cached)
+
+        breaker = self.__breaker(endpoint)
+        if breaker is not None and not breaker.allow():
+            return {"error": f"Circuit breaker open for {breaker.name} endpoints"}
+        failed = False
+        start = time.monotonic()
         try:
-            response = requests.get(self.url, headers=headers, params=params, timeout=timeout)
+            response = self.__send_get(url, headers=headers, params=params, timeout=timeout)
             response.raise_for_status()
-            return json.loads(response.content)
+            result = json.loads(response.content)
+            if cache_key is not None:
+                self.cache.set(cache_key, endpoint, response.content)
+            return result
         except requests.exceptions.HTTPError as err:
+            failed = response.status_code >= 500
             if response.status_code == 400 and not response.text:
                 return {"error": "Received a 400 error with an empty body."}
             elif not response.text:
@@ -92,14 +259,40 @@ class Firewalla:
             else:
                 return {"error": f"HTTP Request Error occurred: {err.response.text}"}
         except requests.exceptions.ConnectionError as err:
+            failed = True
             return {"error": f"ConnectionError occurred: {str(err)}"}
         except requests.exceptions.Timeout as err:
+            failed = True
             return {"error": f"Timeout occurred: {str(err)}"}
         except requests.exceptions.RequestException as err:
+            failed = True
             return {"error": f"HTTP Request Error occurred: {str(err)}"}
         except json.JSONDecodeError as err:
             return {"error": f"JSONDecodeError occurred: {str(err)}"}
+        finally:
+            if breaker is not None:
+                breaker.record(not failed, time.monotonic() - start)
         
+    def __send_get(self, url: str, headers: Dict[str, str], params: Optional[Dict], timeout: int) -> requests.Response:
+        """
+        Send a GET request, hedging it when a hedge policy is configured.
+
+        Args:
+            url (str): The URL to request.
+            headers (Dict[str, str]): The request headers.
+            params (Dict, optional): The query parameters.
+            timeout (int): The maximum number of seconds to wait for a response.
+
+        Returns:
+            requests.Response: The response that arrived first.
+        """
+        http = self.__http()
+        if self.hedge_policy is None:
+            return http.get(url, headers=headers, params=params, timeout=timeout)
+        return self.hedge_policy.execute(
+            lambda: http.get(url, headers=headers, params=params, timeout=timeout)
+        )
+
     def __post(self, endpoint: str, data: Optional[Dict] = {}, timeout: int = 10) -> Dict:
         """
         Send a POST request to the specified endpoint.
@@ -113,22 +306,33 @@ class Firewalla:
             Dict: The JSON response from the API.
             If the request fails, returns a dictionary containing an error message.
         """
+        breaker = self.__breaker(endpoint)
+        if breaker is not None and not breaker.allow():
+            return {"error": f"Circuit breaker open for {breaker.name} endpoints"}
+        failed = False
+        start = time.monotonic()
         try:
             data = {k: (v if v is not None else "") for k, v in data.items()}
             headers = self.__get_headers()
             url = f"{self.domain}/{self.api_version}/{endpoint}"
-            response = requests.post(url, headers=headers, json=data, timeout=timeout)
+            response = self.__http().post(url, headers=headers, json=data, timeout=timeout)
             response.raise_for_status()
             return json.loads(response.content)
         except requests.exceptions.HTTPError as err:
+            failed = response.status_code >= 500
             if response.status_code == 400 and not response.text:
                 return {"error": "Received a 400 error with an empty body."}
             else:
                 return json.loads(err.response.text)
         except requests.exceptions.RequestException as err:
+            failed = True
             return {"error": f"HTTP Request Error occurred: {str(err)}"}
         except json.JSONDecodeError as err:
             return {"error": f"JSONDecodeError occurred: {str(err)}"}
+        finally:
+            if breaker is not None:
+                breaker.record(not failed, time.monotonic() - start)
+            self.__invalidate(endpoint)
 
     def __put(self, endpoint: str, data: Optional[Dict] = None, timeout: int = 10) -> Dict:
         """
@@ -143,10 +347,22 @@ class Firewalla:
             Dict: The JSON response from the API.
         Raises:
             HTTPError: If the HTTP request returned an unsuccessful status code.
+            RequestException: If the circuit breaker is open or the request failed.
         """
+        breaker = self.__breaker(endpoint)
+        if breaker is not None and not breaker.allow():
+            raise requests.exceptions.RequestException(f"Circuit breaker open for {breaker.name} endpoints")
         headers = self.__get_headers()
         url = f"{self.domain}/{self.api_version}/{endpoint}"
-        response = requests.put(url, headers=headers, json=data, timeout=timeout)
+        failed = True
+        start = time.monotonic()
+        try:
+            response = self.__http().put(url, headers=headers, json=data, timeout=timeout)
+            failed = response.status_code >= 500
+        finally:
+            if breaker is not None:
+                breaker.record(not failed, time.monotonic() - start)
+            self.__invalidate(endpoint)
         response.raise_for_status()
         return response.json()
 
@@ -163,10 +379,22 @@ class Firewalla:
             Dict: The JSON response from the API.
         Raises:
             HTTPError: If the HTTP request returned an unsuccessful status code.
+            RequestException: If the circuit breaker is open or the request failed.
         """
+        breaker = self.__breaker(endpoint)
+        if breaker is not None and not breaker.allow():
+            raise requests.exceptions.RequestException(f"Circuit breaker open for {breaker.name} endpoints")
         headers = self.__get_headers()
         url = f"{self.domain}/{self.api_version}/{endpoint}"
-        response = requests.delete(url, headers=headers, params=params, timeout=timeout)
+        failed = True
+        start = time.monotonic()
+        try:
+            response = self.__http().delete(url, headers=headers, params=params, timeout=timeout)
+            failed = response.status_code >= 500
+        finally:
+            if breaker is not None:
+                breaker.record(not failed, time.monotonic() - start)
+            self.__invalidate(endpoint)
         response.raise_for_status()
         return response.json()
 
@@ -181,7 +409,7 @@ class Firewalla:
             Union[Dict, List]: The boxes data. If multiple boxes are retrieved, a list is returned. 
                             Otherwise, returns a dictionary containing the box data.
         """
-        return self.__get("boxes", params={"group": group})
+        return self.__decode(self.__get("boxes", params={"group": group}), Box)
     
     def get_alarms(self, params: AlarmParams) -> Union[Dict, List]:
         """
@@ -190,8 +418,33 @@ class Firewalla:
         Returns:
             Union[Dict, List]: The alarms data.
         """
-        return self.__get("alarms", params=params)
+        return self.__decode(self.__get("alarms", params=params), Alarm)
+
+
+    def watch_alarms(self, query: Optional[str], handlers: Iterable[AlarmHandler], background: bool = False, **options) -> AlarmWatcher:
+        """
+        Watch for new alarms and dispatch them to handler callbacks.
 
+        The poll interval drops to `min_interval` while alarms are arriving and backs off
+        towards `max_interval` when idle. Each poll only asks for alarms newer than the
+        last one seen, and a bounded seen-set drops duplicates.
+
+        Args:
+            query (Optional[str]): The alarm query to watch.
+            handlers (Iterable[AlarmHandler]): Callbacks invoked with every new alarm.
+            background (bool, optional): Run the watcher on a daemon thread and return immediately. Defaults to False.
+            **options: Additional `AlarmWatcher` options, e.g. `min_interval`, `max_interval`, `workers`,
+                       `max_pending` or `stop_event`.
+
+        Returns:
+            AlarmWatcher: The watcher. When running in the foreground it is returned once stopped;
+                          its `metrics` include the detection latency.
+        """
+        watcher = AlarmWatcher(self, handlers, query=query, **options)
+        if background:
+            watcher.start()
+            return watcher
+        return watcher.run()
 
     def get_alarm(self, box_id: str, alarm_id: str) -> Union[Dict, List]:
         """
@@ -204,7 +457,7 @@ class Firewalla:
         Returns:
             Union[Dict, List]: The alarm data.
         """
-        return self.__get(f"alarms/{box_id}/{alarm_id}")
+        return self.__decode(self.__get(f"alarms/{box_id}/{alarm_id}"), Alarm)
     
     def delete_alarm(self, box_id: str, alarm_id: str) -> Dict:
         """
@@ -254,8 +507,22 @@ class Firewalla:
             Union[Dict, List]: The flows data.
         """
         
-        return self.__get("flows", params=params)
+        return self.__decode(self.__get("flows", params=params), Flow)
     
+    def export(self, endpoint: ExportEndpoint, params: Optional[Dict] = None, **options) -> ExportPipeline:
+        """
+        Export all pages of flows or alarms, decoding pages in a process pool.
+
+        Args:
+            endpoint (ExportEndpoint): `flows` or `alarms`.
+            params (Dict, optional): The query parameters, e.g. `query`, `limit` and `cursor`. Defaults to None.
+            **options: Additional `ExportPipeline` options, e.g. `fields`, `record_filter`, `workers` or `prefetch`.
+
+        Returns:
+            ExportPipeline: The pipeline. Iterate it for records in order, or use `batches()` for pages and cursors.
+        """
+        return ExportPipeline(self, endpoint, params=params, **options)
+
     def get_target_lists(self) -> Union[Dict, List]:
         """
         Retrieve the target lists.
@@ -263,7 +530,7 @@ class Firewalla:
         Returns:
             Union[Dict, List]: The target lists data.
         """
-        return self.__get("target-lists")
+        return self.__decode(self.__get("target-lists"), TargetList)
 
     def get_target_list(self, id: str = None) -> Union[Dict, List]:
         """
@@ -275,7 +542,7 @@ class Firewalla:
         Returns:
             Union[Dict, List]: The target list data.
         """
-        return self.__get(f"target-lists/{id}")
+        return self.__decode(self.__get(f"target-lists/{id}"), TargetList)
     
     def create_target_list(self, name: str, targets: List[str], owner: str, category: str = None, notes: str = None) -> Dict:
         """
@@ -342,7 +609,7 @@ class Firewalla:
             "box": box,
             "group": group
         }
-        return self.__get("devices", params=params)
+        return self.__decode(self.__get("devices", params=params), Device)
     
     def get_stats(self, type: FlowType, params: StatsParams = None) -> Union[Dict, List]:
         """
@@ -376,7 +643,7 @@ class Firewalla:
         Returns:
             dict: The flow trends data.
         """
-        return self.__get("trends/flows")
+        return self.__decode(self.__get("trends/flows"), TrendPoint)
     
     def get_alarm_trends(self) -> Dict:
         """
@@ -385,7 +652,7 @@ class Firewalla:
         Returns:
             Dict: The alarm trends data.
         """
-        return self.__get("trends/alarms")
+        return self.__decode(self.__get("trends/alarms"), TrendPoint)
     
     def get_rule_trends(self) -> Dict:
         """
@@ -394,4 +661,63 @@ class Firewalla:
         Returns:
             dict: The rule trends data.
         """
-        return self.__get("trends/rules")
+        return self.__decode(self.__get("trends/rules"), TrendPoint)
+
+    def snapshot(self, deadline: float = 10.0, group: Optional[str] = None) -> Snapshot:
+        """
+        Fetch boxes, devices, stats and trends concurrently under one time budget.
+
+        Sections that have not finished when the deadline passes are reported with a
+        `timeout` status instead of delaying the result.
+
+        Args:
+            deadline (float, optional): The overall time budget in seconds. Defaults to 10 seconds.
+            group (str, optional): The group to filter boxes, devices and stats by. Defaults to None.
+
+        Returns:
+            Snapshot: Whether every section finished, the total elapsed time, and per-section
+                      status, data, error message and elapsed time. With `response_models`, boxes,
+                      devices and trends are decoded like the corresponding `get_*` methods.
+        """
+        stats_params = {"group": group, "limit": None} if group is not None else None
+        requests_by_section: Dict[str, Tuple[str, Optional[Dict], Optional[type[Model]]]] = {
+            "boxes": ("boxes", {"group": group}, Box),
+            "devices": ("devices", {"box": None, "group": group}, Device),
+            "simple_stats": ("stats/simple", {"group": group}, None),
+            **{f"stats.{type}": (f"stats/{type}", stats_params, None) for type in get_args(FlowType)},
+            "flow_trends": ("trends/flows", None, TrendPoint),
+            "alarm_trends": ("trends/alarms", None, TrendPoint),
+            "rule_trends": ("trends/rules", None, TrendPoint),
+        }
+
+        start = time.monotonic()
+
+        def fetch(endpoint: str, params: Optional[Dict], model: Optional[type[Model]]) -> Tuple[Union[Dict, List], float]:
+            data = self.__get(endpoint, params=params, timeout=deadline)
+            if model is not None:
+                data = self.__decode(data, model)
+            return data, time.monotonic() - start
+
+        executor = ThreadPoolExecutor(max_workers=len(requests_by_section), thread_name_prefix="firewalla-snapshot")
+        futures = {
+            name: executor.submit(fetch, endpoint, params, model)
+            for name, (endpoint, params, model) in requests_by_section.items()
+        }
+        wait(futures.values(), timeout=deadline)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        sections: Dict[str, SnapshotSection] = {}
+        for name, future in futures.items():
+            if not future.done() or future.cancelled():
+                sections[name] = {"status": "timeout", "data": None, "error": None, "elapsed": None}
+                continue
+            data, elapsed = future.result()
+            if isinstance(data, dict) and "error" in data:
+                sections[name] = {"status": "error", "data": None, "error": data["error"], "elapsed": elapsed}
+            else:
+                sections[name] = {"status": "ok", "data": data, "error": None, "elapsed": elapsed}
+        return {
+            "complete": all(section["status"] != "timeout" for section in sections.values()),
+            "elapsed": time.monotonic() - start,
+            "sections": sections,
+        }
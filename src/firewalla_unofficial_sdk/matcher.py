@@ -0,0 +1,460 @@
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from typing import Dict, List, Iterable, Iterator, Optional, Set, Tuple, Union
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+MAGIC = b"FWTLM\x00\x00\x02"
+# Tables are written in native byte order so they can be read through memoryview casts;
+# BYTE_ORDER_MARK tells a reader whether the file was written with its own byte order.
+HEADER = struct.Struct("=IIIIIII")
+BYTE_ORDER_MARK = 0x01020304
+# Entry: key offset, key length, first ref, domain ref count, wildcard ref count
+ENTRY_FIELDS = 5
+# Slot: key hash, entry index + 1 (0 for an empty slot)
+SLOT_FIELDS = 2
+V4_PREFIXES = 33
+V6_PREFIXES = 129
+
+# Key prefixes used by the serialized format. Domain keys hold both the domain and the wildcard entries.
+DOMAIN_KEY = b"D"
+IPV4_KEY = b"4"
+IPV6_KEY = b"6"
+
+
+def parse_target(target: str) -> Tuple[str, Union[str, IPNetwork]]:
+    """
+    Classify a target list entry.
+
+    Args:
+        target (str): The target, e.g. `example.com`, `*.example.com`, `10.0.0.1` or `10.0.0.0/8`.
+
+    Returns:
+        Tuple[str, Union[str, IPNetwork]]: The kind of entry (`domain`, `wildcard`, `ip` or `invalid`)
+                                           and its normalized value.
+    """
+    target = target.strip().lower().rstrip(".")
+    if not target:
+        return "invalid", target
+    # Only pay for ipaddress parsing when the entry could be an address
+    if target[0].isdigit() or ":" in target:
+        try:
+            return "ip", ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            pass
+    if "/" in target:
+        return "invalid", target
+    if target.startswith("*."):
+        return "wildcard", target[2:]
+    return "domain", target
+
+
+def parse_address(host: str) -> Optional[Union[ipaddress.IPv4Address, ipaddress.IPv6Address]]:
+    """
+    Parse a host as an IP address, returning None for domains.
+    """
+    if not host or not (host[0].isdigit() or ":" in host):
+        return None
+    try:
+        return ipaddress.ip_address(host)
+    except ValueError:
+        return None
+
+
+def reversed_labels(domain: str) -> List[str]:
+    """
+    Split a domain into labels, top-level domain first.
+    """
+    labels = domain.lower().rstrip(".").split(".")
+    labels.reverse()
+    return labels
+
+
+class _DomainNode:
+    __slots__ = ("children", "domain", "wildcard")
+
+    def __init__(self):
+        self.children: Dict[str, "_DomainNode"] = {}
+        # Lists matching this domain and everything below it
+        self.domain: Set[str] = set()
+        # Lists matching only the subdomains of this domain
+        self.wildcard: Set[str] = set()
+
+
+class _PrefixNode:
+    __slots__ = ("children", "lists")
+
+    def __init__(self):
+        self.children: List[Optional["_PrefixNode"]] = [None, None]
+        self.lists: Set[str] = set()
+
+
+class TargetListMatcher:
+    '''
+    Target list matcher
+    Answers which target lists cover a domain or IP address
+    '''
+
+    def __init__(self, target_lists: Optional[Iterable[Dict]] = None):
+        """
+        Initialize the matcher.
+
+        Args:
+            target_lists (Iterable[Dict], optional): Target lists as returned by `get_target_lists`. Defaults to None.
+        """
+        self.domains = _DomainNode()
+        self.prefixes: Dict[int, _PrefixNode] = {4: _PrefixNode(), 6: _PrefixNode()}
+        self.entries: Dict[str, List[Tuple[str, Union[str, IPNetwork]]]] = {}
+        for target_list in target_lists or []:
+            self.update_list(target_list)
+
+    def update_list(self, target_list: Dict) -> None:
+        """
+        Add a target list, replacing any entries previously loaded for the same list ID.
+
+        Args:
+            target_list (Dict): The target list, with at least `id` and `targets`.
+        """
+        list_id = target_list["id"]
+        self.remove_list(list_id)
+        entries = []
+        for target in target_list.get("targets") or []:
+            kind, value = parse_target(str(target))
+            if kind == "invalid":
+                continue
+            self._insert(list_id, kind, value)
+            entries.append((kind, value))
+        self.entries[list_id] = entries
+
+    def remove_list(self, list_id: str) -> None:
+        """
+        Remove all entries of a target list.
+
+        Args:
+            list_id (str): The ID of the target list.
+        """
+        for kind, value in self.entries.pop(list_id, []):
+            if kind == "ip":
+                self._discard_prefix(self.prefixes[value.version], value, 0, list_id)
+            else:
+                self._discard_domain(self.domains, reversed_labels(value), 0, kind, list_id)
+
+    def _insert(self, list_id: str, kind: str, value: Union[str, IPNetwork]) -> None:
+        if kind == "ip":
+            node = self.prefixes[value.version]
+            bits = int(value.network_address)
+            width = value.max_prefixlen
+            for depth in range(value.prefixlen):
+                bit = (bits >> (width - 1 - depth)) & 1
+                if node.children[bit] is None:
+                    node.children[bit] = _PrefixNode()
+                node = node.children[bit]
+            node.lists.add(list_id)
+            return
+        node = self.domains
+        for label in reversed_labels(value):
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = _DomainNode()
+            node = child
+        (node.domain if kind == "domain" else node.wildcard).add(list_id)
+
+    def _discard_domain(self, node: _DomainNode, labels: List[str], depth: int, kind: str, list_id: str) -> bool:
+        """
+        Remove a list ID from a domain entry, pruning nodes left empty. Returns True if `node` is empty.
+        """
+        if depth == len(labels):
+            (node.domain if kind == "domain" else node.wildcard).discard(list_id)
+        else:
+            child = node.children.get(labels[depth])
+            if child is not None and self._discard_domain(child, labels, depth + 1, kind, list_id):
+                del node.children[labels[depth]]
+        return not (node.children or node.domain or node.wildcard)
+
+    def _discard_prefix(self, node: _PrefixNode, network: IPNetwork, depth: int, list_id: str) -> bool:
+        """
+        Remove a list ID from a prefix entry, pruning nodes left empty. Returns True if `node` is empty.
+        """
+        if depth == network.prefixlen:
+            node.lists.discard(list_id)
+        else:
+            bit = (int(network.network_address) >> (network.max_prefixlen - 1 - depth)) & 1
+            child = node.children[bit]
+            if child is not None and self._discard_prefix(child, network, depth + 1, list_id):
+                node.children[bit] = None
+        return not (node.lists or node.children[0] or node.children[1])
+
+    def match(self, host: str) -> Set[str]:
+        """
+        Find the target lists matching a host.
+
+        Args:
+            host (str): A domain or an IP address.
+
+        Returns:
+            Set[str]: The IDs of the matching target lists.
+        """
+        address = parse_address(host)
+        if address is None:
+            return self.match_domain(host)
+        return self.match_ip(address)
+
+    def match_domain(self, domain: str) -> Set[str]:
+        """
+        Find the target lists matching a domain.
+
+        Args:
+            domain (str): The domain to look up.
+
+        Returns:
+            Set[str]: The IDs of the matching target lists.
+        """
+        matched: Set[str] = set()
+        node = self.domains
+        for label in reversed_labels(domain):
+            if node.wildcard:
+                matched |= node.wildcard
+            node = node.children.get(label)
+            if node is None:
+                return matched
+            if node.domain:
+                matched |= node.domain
+        return matched
+
+    def match_ip(self, address: Union[str, ipaddress.IPv4Address, ipaddress.IPv6Address]) -> Set[str]:
+        """
+        Find the target lists with an IP or CIDR entry covering an address.
+
+        Args:
+            address (Union[str, IPv4Address, IPv6Address]): The address to look up.
+
+        Returns:
+            Set[str]: The IDs of the matching target lists.
+        """
+        if isinstance(address, str):
+            address = ipaddress.ip_address(address)
+        node = self.prefixes[address.version]
+        matched = set(node.lists)
+        bits = int(address)
+        width = address.max_prefixlen
+        for depth in range(width):
+            node = node.children[(bits >> (width - 1 - depth)) & 1]
+            if node is None:
+                break
+            if node.lists:
+                matched |= node.lists
+        return matched
+
+    def _keys(self) -> Iterator[Tuple[bytes, int, str]]:
+        """
+        Yield the serialized key, the ref group (domain or wildcard) and list ID of every entry.
+        """
+        for list_id, entries in self.entries.items():
+            for kind, value in entries:
+                if kind == "ip":
+                    prefix = IPV4_KEY if value.version == 4 else IPV6_KEY
+                    yield prefix + bytes([value.prefixlen]) + value.network_address.packed, 0, list_id
+                else:
+                    yield DOMAIN_KEY + ".".join(reversed_labels(value)).encode(), int(kind == "wildcard"), list_id
+
+    def save(self, path: str) -> None:
+        """
+        Serialize the matcher to a file that can be opened with `MappedTargetListMatcher`.
+
+        The file is written next to `path` and moved over it, so processes that have the old
+        file mapped keep reading it until they reopen `path`.
+
+        Args:
+            path (str): The file to write.
+        """
+        list_ids = list(self.entries)
+        list_index = {list_id: index for index, list_id in enumerate(list_ids)}
+        # Key -> (domain list indexes, wildcard list indexes)
+        keys: Dict[bytes, Tuple[Set[int], Set[int]]] = {}
+        v4_prefixes = bytearray(V4_PREFIXES)
+        v6_prefixes = bytearray(V6_PREFIXES)
+        for key, group, list_id in self._keys():
+            keys.setdefault(key, (set(), set()))[group].add(list_index[list_id])
+            if key[:1] == IPV4_KEY:
+                v4_prefixes[key[1]] = 1
+            elif key[:1] == IPV6_KEY:
+                v6_prefixes[key[1]] = 1
+
+        # Open addressing hash table with linear probing, at most half full
+        n_slots = 1
+        while n_slots < 2 * len(keys):
+            n_slots *= 2
+        slots = array("I", bytes(4 * SLOT_FIELDS * n_slots))
+        mask = n_slots - 1
+        lists_blob = json.dumps(list_ids).encode()
+        entries = array("I")
+        refs = array("I")
+        blob = bytearray()
+        for index, (key, (domain, wildcard)) in enumerate(keys.items()):
+            entries.extend((len(blob), len(key), len(refs), len(domain), len(wildcard)))
+            refs.extend(sorted(domain))
+            refs.extend(sorted(wildcard))
+            blob += key
+            key_hash = zlib.crc32(key)
+            slot = key_hash & mask
+            while slots[SLOT_FIELDS * slot + 1]:
+                slot = (slot + 1) & mask
+            slots[SLOT_FIELDS * slot] = key_hash
+            slots[SLOT_FIELDS * slot + 1] = index + 1
+
+        directory, name = os.path.split(os.path.abspath(path))
+        fd, temporary = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(MAGIC)
+                file.write(HEADER.pack(
+                    BYTE_ORDER_MARK, len(list_ids), len(keys), n_slots, len(refs), len(lists_blob), len(blob)
+                ))
+                file.write(v4_prefixes)
+                file.write(v6_prefixes)
+                file.write(lists_blob)
+                file.write(slots.tobytes())
+                file.write(entries.tobytes())
+                file.write(refs.tobytes())
+                file.write(blob)
+            # mkstemp creates the file private; give it the permissions of the file it replaces
+            os.chmod(temporary, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+            # Never truncate a file other processes may have mapped; swap in a new one instead
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+class MappedTargetListMatcher:
+    '''
+    Read-only target list matcher
+    Looks up hosts in a file written by `TargetListMatcher.save`, shared between processes through mmap
+    '''
+
+    def __init__(self, path: str):
+        """
+        Open a serialized matcher.
+
+        Args:
+            path (str): The file written by `TargetListMatcher.save`.
+
+        Raises:
+            ValueError: If the file is not a serialized matcher, or was written on a machine with another byte order.
+        """
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a serialized target list matcher")
+        offset = len(MAGIC)
+        mark, n_lists, n_entries, self.n_slots, n_refs, lists_len, keys_len = HEADER.unpack_from(self.buffer, offset)
+        if mark != BYTE_ORDER_MARK:
+            self.buffer.close()
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+        offset += HEADER.size
+        self.v4_prefixes = [plen for plen in range(V4_PREFIXES) if self.buffer[offset + plen]]
+        offset += V4_PREFIXES
+        self.v6_prefixes = [plen for plen in range(V6_PREFIXES) if self.buffer[offset + plen]]
+        offset += V6_PREFIXES
+        self.list_ids: List[str] = json.loads(self.buffer[offset:offset + lists_len])
+        offset += lists_len
+        if len(self.list_ids) != n_lists or len(self.buffer) != offset + keys_len + 4 * (
+            SLOT_FIELDS * self.n_slots + ENTRY_FIELDS * n_entries + n_refs
+        ):
+            self.buffer.close()
+            raise ValueError(f"{path} is truncated or corrupt")
+        # Views straight into the mapping: indexing them reads the file without copying or unpacking it
+        self.view = memoryview(self.buffer)
+        tables = []
+        for count in (SLOT_FIELDS * self.n_slots, ENTRY_FIELDS * n_entries, n_refs):
+            tables.append(self.view[offset:offset + 4 * count].cast("I"))
+            offset += 4 * count
+        self.slots, self.entries, self.refs = tables
+        self.keys = self.view[offset:]
+
+    def close(self) -> None:
+        """
+        Unmap the file.
+        """
+        for view in (self.slots, self.entries, self.refs, self.keys, self.view):
+            view.release()
+        self.buffer.close()
+
+    def __enter__(self) -> "MappedTargetListMatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _lookup(self, key: bytes) -> int:
+        """
+        Find a key in the hash table. Returns the offset of its entry, or -1 if it is missing.
+        """
+        slots, entries = self.slots, self.entries
+        mask = self.n_slots - 1
+        key_hash = zlib.crc32(key)
+        slot = key_hash & mask
+        while True:
+            index = slots[SLOT_FIELDS * slot + 1]
+            if not index:
+                return -1
+            if slots[SLOT_FIELDS * slot] == key_hash:
+                entry = ENTRY_FIELDS * (index - 1)
+                start = entries[entry]
+                if entries[entry + 1] == len(key) and self.keys[start:start + len(key)] == key:
+                    return entry
+            slot = (slot + 1) & mask
+
+    def match(self, host: str) -> Set[str]:
+        """
+        Find the target lists matching a host.
+
+        Args:
+            host (str): A domain or an IP address.
+
+        Returns:
+            Set[str]: The IDs of the matching target lists.
+        """
+        matched: Set[str] = set()
+        if not self.n_slots:
+            return matched
+        entries, refs, list_ids = self.entries, self.refs, self.list_ids
+        address = parse_address(host)
+        if address is None:
+            labels = reversed_labels(host)
+            last = len(labels)
+            suffix = DOMAIN_KEY
+            for depth, label in enumerate(labels, 1):
+                suffix = suffix + label.encode() if depth == 1 else suffix + b"." + label.encode()
+                entry = self._lookup(suffix)
+                if entry < 0:
+                    continue
+                ref = entries[entry + 2]
+                # Wildcard refs follow the domain refs, and only cover strict subdomains
+                end = ref + entries[entry + 3] + (entries[entry + 4] if depth < last else 0)
+                for list_index in refs[ref:end]:
+                    matched.add(list_ids[list_index])
+            return matched
+
+        if address.version == 4:
+            prefix, prefixes = IPV4_KEY, self.v4_prefixes
+        else:
+            prefix, prefixes = IPV6_KEY, self.v6_prefixes
+        bits = int(address)
+        width = address.max_prefixlen
+        size = width // 8
+        for plen in prefixes:
+            network = (bits >> (width - plen) << (width - plen)) if plen else 0
+            entry = self._lookup(prefix + bytes((plen,)) + network.to_bytes(size, "big"))
+            if entry >= 0:
+                ref = entries[entry + 2]
+                for list_index in refs[ref:ref + entries[entry + 3]]:
+                    matched.add(list_ids[list_index])
+        return matched
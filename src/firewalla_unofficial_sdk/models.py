@@ -0,0 +1,304 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, TypeVar, Union
+
+M = TypeVar("M", bound="Model")
+
+# Sets of keys absent from records, shared by every record of the same shape
+_ABSENT: Dict[frozenset, frozenset] = {}
+
+
+class Lazy:
+    '''
+    Lazily wrapped nested field
+    Keeps the parsed dict until first access, then caches the model built from it
+    '''
+
+    def __init__(self, key: str, model: Type["Model"]):
+        """
+        Initialize the field.
+
+        Args:
+            key (str): The key of the field in the API response.
+            model (Type[Model]): The model the value is decoded into.
+        """
+        self.key: str = key
+        self.model: Type["Model"] = model
+        self.slot: str = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.slot = f"_{name}"
+
+    def __get__(self, instance: Optional["Model"], owner: type) -> Any:
+        if instance is None:
+            return self
+        value = getattr(instance, self.slot)
+        if isinstance(value, dict):
+            value = self.model(value)
+            setattr(instance, self.slot, value)
+        return value
+
+
+class Model(Mapping):
+    '''
+    Base response model
+    Slotted record that copies scalar fields and wraps nested ones in models on first access.
+    Models are built from records `json.loads` already parsed, nested dicts included, so they cost
+    construction time on top of it; what they save is memory per retained record.
+    Models are read-only mappings of their response keys, so code written for dicts keeps working.
+    '''
+
+    __slots__ = ("_extra", "_absent")
+
+    # (attribute, response key) pairs copied at construction
+    _fields: Tuple[Tuple[str, str], ...] = ()
+    # Lazy fields, collected from the class body
+    _lazy: Tuple[Tuple[str, Lazy], ...] = ()
+    # Every response key the model has an attribute for
+    _known: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._lazy = tuple((name, value) for name, value in vars(cls).items() if isinstance(value, Lazy))
+        cls._known = frozenset([key for _, key in cls._fields] + [field.key for _, field in cls._lazy])
+
+    def __init__(self, raw: Dict):
+        """
+        Build the model from an API record.
+
+        Args:
+            raw (Dict): The record as returned by the API.
+        """
+        get = raw.get
+        for attr, key in self._fields:
+            setattr(self, attr, get(key))
+        for _, field in self._lazy:
+            setattr(self, field.slot, get(field.key))
+        keys = raw.keys()
+        # Keys the model doesn't know about are kept rather than dropped
+        unknown = keys - self._known
+        self._extra: Optional[Dict] = {key: raw[key] for key in unknown} if unknown else None
+        # Missing keys read as None like explicit nulls, but only explicit nulls are keys of the mapping
+        absent = self._known.difference(keys)
+        self._absent: Optional[frozenset] = _ABSENT.setdefault(absent, absent) if absent else None
+
+    def __getitem__(self, key: str) -> Any:
+        """
+        Read a field by its response key, so models can stand in for dicts.
+        """
+        if self._absent is None or key not in self._absent:
+            for attr, field_key in self._fields:
+                if field_key == key:
+                    return getattr(self, attr)
+            for name, field in self._lazy:
+                if field.key == key:
+                    return getattr(self, name)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterate over the response keys present in the record, including explicit nulls, like `to_dict`.
+        """
+        absent = self._absent or ()
+        for _, key in self._fields:
+            if key not in absent:
+                yield key
+        for _, field in self._lazy:
+            if field.key not in absent:
+                yield field.key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return len(self._known) - len(self._absent or ()) + len(self._extra or ())
+
+    def to_dict(self) -> Dict:
+        """
+        Convert the model back into a response record.
+
+        Returns:
+            Dict: The record, with nested models converted as well. Fields that were missing are omitted,
+                  explicit nulls are kept.
+        """
+        absent = self._absent or ()
+        record: Dict = {}
+        for attr, key in self._fields:
+            if key not in absent:
+                record[key] = getattr(self, attr)
+        for name, field in self._lazy:
+            if field.key in absent:
+                continue
+            value = getattr(self, field.slot)
+            if isinstance(value, Model):
+                value = value.to_dict()
+            record[field.key] = value
+        if self._extra:
+            record.update(self._extra)
+        return record
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Model):
+            return NotImplemented
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{attr}={getattr(self, attr)!r}" for attr, _ in self._fields[:3])
+        return f"{type(self).__name__}({fields})"
+
+
+class Reference(Model):
+    '''
+    Reference to another object, e.g. a box group or a device network
+    '''
+
+    __slots__ = ("id", "name")
+    _fields = (("id", "id"), ("name", "name"))
+
+
+class Host(Model):
+    '''
+    Device or remote endpoint of a flow or alarm
+    '''
+
+    __slots__ = ("id", "name", "ip", "port", "_network")
+    _fields = (("id", "id"), ("name", "name"), ("ip", "ip"), ("port", "port"))
+    network = Lazy("network", Reference)
+
+
+class Box(Model):
+    '''
+    Firewalla box
+    '''
+
+    __slots__ = (
+        "gid", "name", "model", "mode", "version", "online", "last_seen", "license",
+        "public_ip", "location", "device_count", "rule_count", "alarm_count", "_group",
+    )
+    _fields = (
+        ("gid", "gid"), ("name", "name"), ("model", "model"), ("mode", "mode"),
+        ("version", "version"), ("online", "online"), ("last_seen", "lastSeen"),
+        ("license", "license"), ("public_ip", "publicIP"), ("location", "location"),
+        ("device_count", "deviceCount"), ("rule_count", "ruleCount"), ("alarm_count", "alarmCount"),
+    )
+    group = Lazy("group", Reference)
+
+
+class Device(Model):
+    '''
+    Device seen by a box
+    '''
+
+    __slots__ = (
+        "id", "gid", "name", "ip", "mac_vendor", "online", "last_seen", "ip_reserved",
+        "total_download", "total_upload", "_network", "_group",
+    )
+    _fields = (
+        ("id", "id"), ("gid", "gid"), ("name", "name"), ("ip", "ip"),
+        ("mac_vendor", "macVendor"), ("online", "online"), ("last_seen", "lastSeen"),
+        ("ip_reserved", "ipReserved"), ("total_download", "totalDownload"), ("total_upload", "totalUpload"),
+    )
+    network = Lazy("network", Reference)
+    group = Lazy("group", Reference)
+
+
+class Alarm(Model):
+    '''
+    Alarm raised by a box
+    '''
+
+    __slots__ = ("aid", "gid", "type", "ts", "message", "direction", "protocol", "status", "_device", "_remote")
+    _fields = (
+        ("aid", "aid"), ("gid", "gid"), ("type", "type"), ("ts", "ts"), ("message", "message"),
+        ("direction", "direction"), ("protocol", "protocol"), ("status", "alarmStatus"),
+    )
+    device = Lazy("device", Host)
+    remote = Lazy("remote", Host)
+
+
+class Flow(Model):
+    '''
+    Network flow
+    '''
+
+    __slots__ = (
+        "ts", "gid", "protocol", "direction", "block", "block_type", "download", "upload",
+        "duration", "count", "category", "region", "_device", "_source", "_destination",
+    )
+    _fields = (
+        ("ts", "ts"), ("gid", "gid"), ("protocol", "protocol"), ("direction", "direction"),
+        ("block", "block"), ("block_type", "blockType"), ("download", "download"), ("upload", "upload"),
+        ("duration", "duration"), ("count", "count"), ("category", "category"), ("region", "region"),
+    )
+    device = Lazy("device", Host)
+    source = Lazy("source", Host)
+    destination = Lazy("destination", Host)
+
+
+class TargetList(Model):
+    '''
+    Target list
+    '''
+
+    __slots__ = ("id", "name", "owner", "category", "notes", "targets", "last_updated")
+    _fields = (
+        ("id", "id"), ("name", "name"), ("owner", "owner"), ("category", "category"),
+        ("notes", "notes"), ("targets", "targets"), ("last_updated", "lastUpdated"),
+    )
+
+
+class RuleTarget(Model):
+    '''
+    Target a rule applies to
+    '''
+
+    __slots__ = ("type", "value", "dns_only")
+    _fields = (("type", "type"), ("value", "value"), ("dns_only", "dnsOnly"))
+
+
+class Rule(Model):
+    '''
+    Rule on a box
+    '''
+
+    __slots__ = (
+        "id", "gid", "action", "direction", "status", "notes", "ts", "update_ts", "hit_count", "_target", "_scope",
+    )
+    _fields = (
+        ("id", "id"), ("gid", "gid"), ("action", "action"), ("direction", "direction"),
+        ("status", "status"), ("notes", "notes"), ("ts", "ts"), ("update_ts", "updateTs"), ("hit_count", "hitCount"),
+    )
+    target = Lazy("target", RuleTarget)
+    scope = Lazy("scope", RuleTarget)
+
+
+class TrendPoint(Model):
+    '''
+    Point of a trend series
+    '''
+
+    __slots__ = ("ts", "value")
+    _fields = (("ts", "ts"), ("value", "value"))
+
+
+def decode(response: Union[Dict, List], model: Type[M]) -> Union[Dict, List, M]:
+    """
+    Decode an API response into models, keeping its shape.
+
+    Args:
+        response (Union[Dict, List]): The response from the API.
+        model (Type[M]): The model of the records.
+
+    Returns:
+        Union[Dict, List, M]: A list of models for list responses, the page with its `results` decoded for
+                              paginated responses, or a single model. Error responses are returned unchanged.
+    """
+    if isinstance(response, list):
+        return [model(record) if isinstance(record, dict) else record for record in response]
+    if "error" in response:
+        return response
+    if isinstance(response.get("results"), list):
+        return {**response, "results": decode(response["results"], model)}
+    return model(response)
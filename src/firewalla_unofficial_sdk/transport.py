@@ -0,0 +1,223 @@
+import importlib.util
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def http2_available() -> bool:
+    """
+    Check whether the optional HTTP/2 dependencies (`httpx` and `h2`) are installed.
+    """
+    return httpx is not None and importlib.util.find_spec("h2") is not None
+
+
+def _to_response(response: "httpx.Response") -> requests.Response:
+    """
+    Convert an httpx response into a `requests.Response`, so callers handle both transports alike.
+    """
+    result = requests.Response()
+    result.status_code = response.status_code
+    result._content = response.content
+    result._content_consumed = True
+    result.headers = CaseInsensitiveDict(response.headers)
+    result.url = str(response.url)
+    result.reason = response.reason_phrase
+    result.encoding = response.encoding
+    return result
+
+
+class Http2Transport:
+    '''
+    HTTP/2 transport
+    Multiplexes concurrent requests over a few pooled HTTP/2 connections, falling back to a larger HTTP/1.1 pool
+    '''
+
+    def __init__(
+        self,
+        max_connections: int = 4,
+        http2: bool = True,
+        http1: bool = True,
+        keepalive_expiry: float = 30.0,
+        verify: bool = True,
+        http1_connections: int = 32,
+    ):
+        """
+        Initialize the transport.
+
+        With `httpx` and `h2` installed, HTTP/2 is negotiated per connection. A few HTTP/2 connections carry many
+        concurrent streams, but an HTTP/1.1 connection carries one request at a time, so origins that answer over
+        HTTP/1.1 are moved to a separate, larger HTTP/1.1 pool. Without the HTTP/2 dependencies, requests go through
+        a pooled `requests.Session` over HTTP/1.1.
+
+        Args:
+            max_connections (int, optional): The maximum number of open HTTP/2 connections. Defaults to 4.
+            http2 (bool, optional): Offer HTTP/2. Defaults to True.
+            http1 (bool, optional): Offer HTTP/1.1. Set to False, with `http2`, to speak HTTP/2 without negotiation,
+                                    e.g. to a plain-text h2c server. Defaults to True.
+            keepalive_expiry (float, optional): Seconds an idle connection is kept open. Defaults to 30 seconds.
+            verify (bool, optional): Verify TLS certificates. Defaults to True.
+            http1_connections (int, optional): The maximum number of open HTTP/1.1 connections, which bounds the
+                                               concurrent requests to an origin that doesn't speak HTTP/2.
+                                               Defaults to 32.
+        Raises:
+            ImportError: If `http1` is disabled and the HTTP/2 dependencies are missing.
+        """
+        self.max_connections: int = max_connections
+        self.http1_connections: int = http1_connections
+        self.http2: bool = http2 and http2_available()
+        if not http1 and not self.http2:
+            raise ImportError("HTTP/2 without HTTP/1.1 requires httpx and h2: pip install 'httpx[http2]'")
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._keepalive_expiry: float = keepalive_expiry
+        self._verify: bool = verify
+        # Origins that answered over HTTP/1.1, and the pool their requests go through from then on
+        self._http1_origins: Set[Tuple[str, str, Optional[int]]] = set()
+        self.http1_client: Optional[Any] = None
+        self.client: Any
+        if httpx is not None:
+            self.client = self._httpx_client(
+                http1=http1, http2=self.http2, connections=max_connections if self.http2 else http1_connections
+            )
+        else:
+            self.client = requests.Session()
+            self.client.verify = verify
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=http1_connections)
+            self.client.mount("https://", adapter)
+            self.client.mount("http://", adapter)
+
+    def _httpx_client(self, http1: bool, http2: bool, connections: int) -> "httpx.Client":
+        return httpx.Client(
+            http1=http1,
+            http2=http2,
+            verify=self._verify,
+            limits=httpx.Limits(
+                max_connections=connections,
+                max_keepalive_connections=connections,
+                keepalive_expiry=self._keepalive_expiry,
+            ),
+        )
+
+    def _client_for(self, url: "httpx.URL") -> Any:
+        """
+        Pick the pool for a URL: the HTTP/1.1 pool once its origin has answered over HTTP/1.1.
+        """
+        if self.http1_client is None or (url.scheme, url.host, url.port) not in self._http1_origins:
+            return self.client
+        return self.http1_client
+
+    def _fell_back(self, url: "httpx.URL") -> None:
+        """
+        Route an origin that didn't negotiate HTTP/2 to the HTTP/1.1 pool.
+        """
+        with self._lock:
+            if self.http1_client is None:
+                self.http1_client = self._httpx_client(http1=True, http2=False, connections=self.http1_connections)
+            self._http1_origins.add((url.scheme, url.host, url.port))
+
+    def _count(self, http_version: str) -> None:
+        with self._lock:
+            self.counters[http_version] = self.counters.get(http_version, 0) + 1
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict] = None,
+        json: Optional[Any] = None,
+        timeout: float = 10,
+    ) -> requests.Response:
+        """
+        Send a request.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            headers (Dict[str, str], optional): The request headers. Defaults to None.
+            params (Dict, optional): The query parameters, encoded the same way `requests` encodes them. Defaults to None.
+            json (Any, optional): The JSON payload. Defaults to None.
+            timeout (float, optional): The maximum number of seconds to wait for a response. Defaults to 10 seconds.
+
+        Returns:
+            requests.Response: The response.
+        Raises:
+            RequestException: `ConnectionError`, `Timeout` or `RequestException` if the request failed.
+        """
+        if httpx is None:
+            response = self.client.request(method, url, headers=headers, params=params, json=json, timeout=timeout)
+            self._count("HTTP/1.1")
+            return response
+        prepared = requests.PreparedRequest()
+        prepared.prepare_url(url, params)
+        target = httpx.URL(prepared.url)
+        client = self._client_for(target)
+        try:
+            response = client.request(method, target, headers=headers, json=json, timeout=timeout)
+        except httpx.TimeoutException as err:
+            raise requests.exceptions.Timeout(str(err)) from err
+        except (httpx.NetworkError, httpx.ProtocolError) as err:
+            raise requests.exceptions.ConnectionError(str(err)) from err
+        except httpx.HTTPError as err:
+            raise requests.exceptions.RequestException(str(err)) from err
+        self._count(response.http_version)
+        if client is self.client and self.http2 and response.http_version == "HTTP/1.1":
+            self._fell_back(target)
+        return _to_response(response)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request. Takes the keyword arguments of `request`.
+        """
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a POST request. Takes the keyword arguments of `request`.
+        """
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a PUT request. Takes the keyword arguments of `request`.
+        """
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a DELETE request. Takes the keyword arguments of `request`.
+        """
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self) -> None:
+        """
+        Close every pooled connection.
+        """
+        self.client.close()
+        if self.http1_client is not None:
+            self.http1_client.close()
+
+    def __enter__(self) -> "Http2Transport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def metrics(self) -> Dict:
+        """
+        Get the transport metrics.
+
+        Returns:
+            Dict: Whether HTTP/2 is offered, and the number of responses per HTTP version.
+        """
+        with self._lock:
+            return {"http2": self.http2, "responses": dict(self.counters)}
@@ -0,0 +1,268 @@
+import bisect
+import math
+import threading
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate
+from typing import Callable, Dict, Iterable, List, Literal, Optional, Tuple, TypeAlias, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .main import Firewalla
+
+Aggregation: TypeAlias = Literal["sum", "mean", "rate", "count", "min", "max", "last"]
+TrendName: TypeAlias = Literal["flows", "alarms", "rules"]
+Point = Tuple[float, float]
+
+
+def _points(response: Union[Dict, List]) -> Iterable[Point]:
+    records = response if isinstance(response, list) else response.get("results") or []
+    for record in records:
+        ts = record.get("ts")
+        if ts is not None:
+            yield float(ts), float(record.get("value") or 0)
+
+
+class TrendSeries:
+    '''
+    Trend series
+    Sorted, array-backed time series that new points are merged into
+    '''
+
+    def __init__(self, points: Optional[Iterable[Point]] = None):
+        """
+        Initialize the series.
+
+        Args:
+            points (Iterable[Point], optional): Initial (timestamp, value) points. Defaults to None.
+        """
+        self.ts: array = array("d")
+        self.values: array = array("d")
+        self._prefix: Optional[List[float]] = None
+        self._lock = threading.Lock()
+        if points is not None:
+            self.merge(points)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def points(self) -> List[Point]:
+        """
+        Get every point of the series.
+
+        Returns:
+            List[Point]: The (timestamp, value) points, oldest first.
+        """
+        return list(zip(self.ts, self.values))
+
+    def merge(self, points: Union[Iterable[Point], Dict, List]) -> int:
+        """
+        Merge points into the series. A point with an existing timestamp replaces the stored value.
+
+        Args:
+            points (Union[Iterable[Point], Dict, List]): (timestamp, value) pairs, or a trends API response.
+
+        Returns:
+            int: The number of timestamps that were not in the series before.
+        """
+        # API records are mappings; anything else is (timestamp, value) pairs, tuples or lists alike
+        if isinstance(points, Mapping) or (isinstance(points, list) and points and isinstance(points[0], Mapping)):
+            points = _points(points)
+        incoming = dict(points)
+        if not incoming:
+            return 0
+        with self._lock:
+            ts, values = self.ts, self.values
+            first = min(incoming)
+            start = bisect.bisect_left(ts, first)
+            if start == len(ts):
+                # Common case: polling only returns points after the ones already held
+                for key in sorted(incoming):
+                    ts.append(key)
+                    values.append(incoming[key])
+                added = len(incoming)
+            else:
+                tail = dict(zip(ts[start:], values[start:]))
+                before = len(tail)
+                tail.update(incoming)
+                added = len(tail) - before
+                keys = sorted(tail)
+                del ts[start:]
+                del values[start:]
+                ts.extend(keys)
+                values.extend(tail[key] for key in keys)
+            self._prefix = None
+        return added
+
+    def _prefix_sums(self) -> List[float]:
+        prefix = self._prefix
+        if prefix is None:
+            prefix = self._prefix = list(accumulate(self.values, initial=0.0))
+        return prefix
+
+    def _bounds(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+        low = 0 if start is None else bisect.bisect_left(self.ts, start)
+        high = len(self.ts) if end is None else bisect.bisect_left(self.ts, end)
+        return low, high
+
+    def _aggregate(self, agg: Aggregation, low: int, high: int, seconds: float) -> float:
+        if agg in ("sum", "mean", "rate"):
+            prefix = self._prefix_sums()
+            total = prefix[high] - prefix[low]
+            if agg == "sum":
+                return total
+            if agg == "mean":
+                return total / (high - low)
+            return total / seconds
+        if agg == "count":
+            return float(high - low)
+        if agg == "min":
+            return min(self.values[low:high])
+        if agg == "max":
+            return max(self.values[low:high])
+        if agg == "last":
+            return self.values[high - 1]
+        raise ValueError(f"Unknown aggregation: {agg}")
+
+    def resample(
+        self,
+        bucket: float,
+        agg: Aggregation = "sum",
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        fill: Optional[float] = None,
+    ) -> List[Point]:
+        """
+        Aggregate the series into fixed-width buckets aligned to the epoch.
+
+        Bucket edges are found by binary search and sums come from a cached prefix-sum
+        array, so the cost grows with the number of buckets rather than the number of points.
+
+        Args:
+            bucket (float): The bucket width in seconds.
+            agg (Aggregation, optional): `sum`, `mean`, `rate` (sum per second), `count`, `min`, `max` or `last`.
+                                         Defaults to `sum`.
+            start (float, optional): The first timestamp to include. Defaults to the start of the series.
+            end (float, optional): The timestamp to stop before. Defaults to the end of the series.
+            fill (float, optional): The value of buckets without points. Defaults to None, which omits them.
+
+        Returns:
+            List[Point]: (bucket start, value) points.
+        """
+        if bucket <= 0:
+            raise ValueError("bucket must be positive")
+        with self._lock:
+            low, high = self._bounds(start, end)
+            if low >= high:
+                return []
+            ts = self.ts
+            edge = math.floor(ts[low] / bucket) * bucket
+            last = ts[high - 1]
+            result: List[Point] = []
+            index = low
+            while edge <= last:
+                next_index = bisect.bisect_left(ts, edge + bucket, index, high)
+                empty = next_index == index
+                if not empty:
+                    result.append((edge, self._aggregate(agg, index, next_index, bucket)))
+                elif fill is not None:
+                    result.append((edge, fill))
+                index = next_index
+                if index >= high:
+                    break
+                if fill is not None or empty:
+                    edge += bucket
+                else:
+                    # Skip straight to the bucket of the next point
+                    edge = max(edge + bucket, math.floor(ts[index] / bucket) * bucket)
+            return result
+
+    def downsample(self, max_points: int, agg: Aggregation = "mean") -> List[Point]:
+        """
+        Resample the series into at most `max_points` buckets, e.g. for a graph of a given width.
+
+        Args:
+            max_points (int): The maximum number of points to return.
+            agg (Aggregation, optional): The aggregation of each bucket. Defaults to `mean`.
+
+        Returns:
+            List[Point]: (bucket start, value) points.
+        """
+        if len(self.ts) <= max_points:
+            return self.points()
+        bucket = (self.ts[-1] - self.ts[0]) / max_points or 1.0
+        result = self.resample(bucket, agg)
+        # Buckets are epoch aligned rather than aligned to the first point, which can add one
+        while len(result) > max_points:
+            bucket *= len(result) / max_points + 0.01
+            result = self.resample(bucket, agg)
+        return result
+
+    def rolling(self, window: float, agg: Literal["sum", "mean", "rate", "count"] = "sum") -> List[Point]:
+        """
+        Aggregate the `window` seconds up to and including each point.
+
+        Args:
+            window (float): The window length in seconds.
+            agg (Literal["sum", "mean", "rate", "count"], optional): The aggregation. Defaults to `sum`.
+
+        Returns:
+            List[Point]: (timestamp, value) points, one per point of the series.
+        """
+        with self._lock:
+            ts = self.ts
+            aggregate: Callable[[Aggregation, int, int, float], float] = self._aggregate
+            result: List[Point] = []
+            low = 0
+            for high, point in enumerate(ts, 1):
+                while ts[low] <= point - window:
+                    low += 1
+                result.append((point, aggregate(agg, low, high, window)))
+            return result
+
+
+class TrendStore:
+    '''
+    Trend store
+    Keeps the flow, alarm and rule trends in memory and merges newly fetched points into them
+    '''
+
+    def __init__(self, client: "Firewalla"):
+        """
+        Initialize the trend store.
+
+        Args:
+            client (Firewalla): The client used to fetch trends.
+        """
+        self.client = client
+        self.series: Dict[TrendName, TrendSeries] = {
+            "flows": TrendSeries(),
+            "alarms": TrendSeries(),
+            "rules": TrendSeries(),
+        }
+        self.fetchers: Dict[TrendName, Callable[[], Union[Dict, List]]] = {
+            "flows": client.get_flow_trends,
+            "alarms": client.get_alarm_trends,
+            "rules": client.get_rule_trends,
+        }
+
+    def __getitem__(self, name: TrendName) -> TrendSeries:
+        return self.series[name]
+
+    def refresh(self, name: Optional[TrendName] = None) -> Dict[str, Union[int, str]]:
+        """
+        Fetch trends and merge them into the stored series.
+
+        Args:
+            name (TrendName, optional): The trend to refresh. Defaults to None (all of them).
+
+        Returns:
+            Dict[str, Union[int, str]]: Per trend, the number of new points, or the error message if the fetch failed.
+        """
+        results: Dict[str, Union[int, str]] = {}
+        for trend in [name] if name else list(self.series):
+            response = self.fetchers[trend]()
+            if isinstance(response, dict) and "error" in response:
+                results[trend] = response["error"]
+                continue
+            results[trend] = self.series[trend].merge(_points(response))
+        return results
@@ -0,0 +1,267 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Iterable, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .main import Firewalla
+
+AlarmHandler = Callable[[Dict], None]
+
+
+class AlarmWatcher:
+    '''
+    Alarm watcher
+    Polls for new alarms and dispatches them to handler callbacks
+    '''
+
+    def __init__(
+        self,
+        client: "Firewalla",
+        handlers: Iterable[AlarmHandler],
+        query: Optional[str] = None,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0,
+        backoff: float = 2.0,
+        limit: int = 200,
+        max_pages: int = 10,
+        overlap: float = 1.0,
+        since: Optional[float] = None,
+        seen_size: int = 10000,
+        workers: int = 4,
+        max_pending: int = 100,
+        stop_event: Optional[threading.Event] = None,
+    ):
+        """
+        Initialize the alarm watcher.
+
+        Args:
+            client (Firewalla): The client used to fetch alarms.
+            handlers (Iterable[AlarmHandler]): Callbacks invoked with every new alarm.
+            query (str, optional): The alarm query to watch. Defaults to None.
+            min_interval (float, optional): Seconds between polls while alarms are arriving. Defaults to 1 second.
+            max_interval (float, optional): Upper bound for the poll interval when idle. Defaults to 60 seconds.
+            backoff (float, optional): Factor the interval grows by after an empty or failed poll. Defaults to 2.
+            limit (int, optional): The page size of each request. Defaults to 200.
+            max_pages (int, optional): The maximum number of pages fetched per poll. When a poll hits it, the next
+                                       poll continues from its cursor before looking for newer alarms, so bursts
+                                       are spread over several polls rather than dropped. Defaults to 10.
+            overlap (float, optional): Seconds before the newest seen alarm to query from, to catch
+                                       alarms indexed late. Duplicates are removed by the seen-set. Defaults to 1 second.
+            since (float, optional): Only watch alarms newer than this timestamp. Defaults to None
+                                     (the first poll dispatches whatever the query returns).
+            seen_size (int, optional): The number of alarm IDs remembered for deduplication. Defaults to 10000.
+            workers (int, optional): The number of handler worker threads. Defaults to 4.
+            max_pending (int, optional): The number of alarms queued for handlers before polling blocks. Defaults to 100.
+            stop_event (threading.Event, optional): Event that stops the watcher when set. Defaults to a new event.
+        """
+        self.client = client
+        self.handlers: List[AlarmHandler] = list(handlers)
+        self.query: Optional[str] = query
+        self.min_interval: float = min_interval
+        self.max_interval: float = max_interval
+        self.backoff: float = backoff
+        self.limit: int = limit
+        self.max_pages: int = max_pages
+        self.overlap: float = overlap
+        self.seen_size: int = seen_size
+        self.interval: float = min_interval
+        self.last_ts: Optional[float] = since
+        # Query, cursor and newest timestamp of a poll cut short by `max_pages`
+        self._query: Optional[str] = None
+        self._cursor: Optional[str] = None
+        self._newest_ts: Optional[float] = None
+        self.stop_event: threading.Event = stop_event or threading.Event()
+        self.seen: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.latencies: deque = deque(maxlen=1000)
+        self.counters: Dict[str, int] = {
+            "polls": 0,
+            "poll_errors": 0,
+            "truncated_polls": 0,
+            "alarms_seen": 0,
+            "duplicates": 0,
+            "dispatched": 0,
+            "handler_errors": 0,
+        }
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="firewalla-alarms")
+
+    def _build_query(self) -> Optional[str]:
+        if self.last_ts is None:
+            return self.query
+        since = f"ts:>{self.last_ts - self.overlap}"
+        return f"{self.query} {since}" if self.query else since
+
+    def _fetch(self) -> Optional[List[Dict]]:
+        """
+        Fetch up to `max_pages` pages of alarms newer than the last one seen, continuing the previous
+        poll's pages if it was cut short. Returns None if the request failed.
+        """
+        alarms: List[Dict] = []
+        if self._cursor is None:
+            self._query = self._build_query()
+        cursor = self._cursor
+        for _ in range(self.max_pages):
+            response = self.client.get_alarms(params={
+                "query": self._query,
+                "groupBy": None,
+                "limit": self.limit,
+                "cursor": cursor,
+            })
+            if isinstance(response, dict) and "error" in response:
+                self.last_error = response["error"]
+                # Start the pages over; `last_ts` hasn't moved, so nothing is skipped
+                self._cursor = None
+                return None
+            if isinstance(response, list):
+                alarms.extend(response)
+                cursor = None
+                break
+            alarms.extend(response.get("results") or [])
+            cursor = response.get("next_cursor")
+            if not cursor:
+                break
+        self._cursor = cursor
+        return alarms
+
+    def _is_new(self, alarm: Dict) -> bool:
+        key = (alarm.get("gid"), alarm.get("aid"))
+        if key in self.seen:
+            self.seen.move_to_end(key)
+            return False
+        self.seen[key] = None
+        if len(self.seen) > self.seen_size:
+            self.seen.popitem(last=False)
+        return True
+
+    def poll_once(self) -> List[Dict]:
+        """
+        Fetch new alarms once, dispatch them and adapt the poll interval.
+
+        Returns:
+            List[Dict]: The alarms that had not been seen before, oldest first.
+        """
+        alarms = self._fetch()
+        with self._lock:
+            self.counters["polls"] += 1
+            if alarms is None:
+                self.counters["poll_errors"] += 1
+        if alarms is None:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+            return []
+
+        new_alarms = [alarm for alarm in alarms if self._is_new(alarm)]
+        new_alarms.sort(key=lambda alarm: alarm.get("ts") or 0)
+        with self._lock:
+            self.counters["alarms_seen"] += len(new_alarms)
+            self.counters["duplicates"] += len(alarms) - len(new_alarms)
+        for alarm in new_alarms:
+            ts = alarm.get("ts")
+            if ts is not None and (self._newest_ts is None or ts > self._newest_ts):
+                self._newest_ts = ts
+            self.dispatch(alarm)
+
+        if self._cursor is not None:
+            # Pages come newest first: only move past the older alarms once every page has been read
+            with self._lock:
+                self.counters["truncated_polls"] += 1
+            self.interval = self.min_interval
+            return new_alarms
+        if self._newest_ts is not None and (self.last_ts is None or self._newest_ts > self.last_ts):
+            self.last_ts = self._newest_ts
+        self._newest_ts = None
+        if new_alarms:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return new_alarms
+
+    def dispatch(self, alarm: Dict) -> None:
+        """
+        Queue an alarm for the handlers, blocking while `max_pending` alarms are already queued.
+
+        Args:
+            alarm (Dict): The alarm to dispatch.
+        """
+        self._pending.acquire()
+        future = self._executor.submit(self._handle, alarm)
+        future.add_done_callback(lambda _: self._pending.release())
+
+    def _handle(self, alarm: Dict) -> None:
+        ts = alarm.get("ts")
+        if ts is not None:
+            latency = time.time() - float(ts)
+            with self._lock:
+                self.latencies.append(latency)
+        for handler in self.handlers:
+            try:
+                handler(alarm)
+            except Exception:
+                with self._lock:
+                    self.counters["handler_errors"] += 1
+        with self._lock:
+            self.counters["dispatched"] += 1
+
+    def run(self, max_polls: Optional[int] = None) -> "AlarmWatcher":
+        """
+        Poll until the stop event is set, then wait for queued alarms to be handled.
+
+        Args:
+            max_polls (int, optional): Stop after this many polls. Defaults to None (run until stopped).
+
+        Returns:
+            AlarmWatcher: The watcher, for inspecting its metrics.
+        """
+        polls = 0
+        try:
+            while not self.stop_event.is_set() and (max_polls is None or polls < max_polls):
+                if polls:
+                    self.stop_event.wait(self.interval)
+                    if self.stop_event.is_set():
+                        break
+                self.poll_once()
+                polls += 1
+        finally:
+            self._executor.shutdown(wait=True)
+        return self
+
+    def start(self) -> threading.Thread:
+        """
+        Run the watcher on a daemon thread.
+
+        Returns:
+            threading.Thread: The thread running the watcher.
+        """
+        thread = threading.Thread(target=self.run, name="firewalla-alarm-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        """
+        Ask the watcher to stop after the current poll.
+        """
+        self.stop_event.set()
+
+    @property
+    def metrics(self) -> Dict:
+        """
+        Get the watcher metrics.
+
+        Returns:
+            Dict: The counters, the current poll interval and the detection latency in seconds
+                  (time from the alarm timestamp to its handlers being invoked).
+        """
+        with self._lock:
+            metrics: Dict = dict(self.counters)
+            latencies = sorted(self.latencies)
+            last = self.latencies[-1] if self.latencies else None
+        metrics["interval"] = self.interval
+        if latencies:
+            metrics["latency_last"] = last
+            metrics["latency_avg"] = sum(latencies) / len(latencies)
+            metrics["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            metrics["latency_max"] = latencies[-1]
+        return metrics
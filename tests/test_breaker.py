@@ -0,0 +1,113 @@
+import json
+import pytest
+import time
+import requests
+from unittest.mock import patch
+from src.firewalla_unofficial_sdk.breaker import CircuitBreaker, CircuitBreakerRegistry, endpoint_family
+from src.firewalla_unofficial_sdk.main import Firewalla
+
+def make_response(payload, status_code=200):
+    response = requests.Response()
+    response._content = json.dumps(payload).encode()
+    response.status_code = status_code
+    return response
+
+def test_endpoint_family():
+    assert endpoint_family("flows") == "flows"
+    assert endpoint_family("rules/123/pause") == "rules"
+    assert endpoint_family("target-lists/TL-1") == "target-lists"
+    assert endpoint_family("stats/simple") == "stats"
+    assert endpoint_family("trends/alarms") == "stats"
+
+def test_breaker_opens_on_failure_rate():
+    transitions = []
+    breaker = CircuitBreaker("flows", min_calls=4, failure_rate_threshold=0.5,
+                             on_state_change=lambda *change: transitions.append(change))
+    for success in (True, False, True):
+        breaker.record(success, 0.1)
+    assert breaker.state == "closed"
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.metrics["rejected"] == 1
+    assert transitions == [("flows", "closed", "open")]
+
+def test_breaker_opens_on_slow_calls():
+    breaker = CircuitBreaker("stats", min_calls=2, slow_call_threshold=1, slow_call_rate_threshold=1)
+    breaker.record(True, 2)
+    breaker.record(True, 3)
+    assert breaker.state == "open"
+
+def test_half_open_probes():
+    breaker = CircuitBreaker("devices", min_calls=1, reset_timeout=0.01, half_open_probes=2)
+    breaker.record(False, 0.1)
+    time.sleep(0.02)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == "half_open"
+    breaker.record(True, 0.1)
+    assert breaker.state == "closed"
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("devices", min_calls=1, reset_timeout=0.01)
+    breaker.record(False, 0.1)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+
+@patch('requests.get')
+def test_get_fails_fast_when_open(mock_get):
+    mock_get.side_effect = requests.exceptions.Timeout("Request timed out")
+    registry = CircuitBreakerRegistry(min_calls=2)
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", circuit_breakers=registry)
+    for _ in range(2):
+        assert firewalla.get_flows() == {"error": "Timeout occurred: Request timed out"}
+    assert firewalla.get_flows() == {"error": "Circuit breaker open for flows endpoints"}
+    assert mock_get.call_count == 2
+
+    # Other endpoint families are unaffected
+    mock_get.side_effect = None
+    mock_get.return_value = make_response([{"id": "device"}])
+    assert firewalla.get_devices() == [{"id": "device"}]
+    assert firewalla.breaker_states() == {"flows": "open", "devices": "closed"}
+
+@patch('requests.get')
+def test_client_errors_do_not_open_breaker(mock_get):
+    mock_get.return_value = make_response({"message": "not found"}, status_code=404)
+    registry = CircuitBreakerRegistry(min_calls=2)
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", circuit_breakers=registry)
+    for _ in range(3):
+        firewalla.get_target_list("missing")
+    assert firewalla.breaker_states() == {"target-lists": "closed"}
+
+@patch('requests.post')
+def test_post_uses_rules_breaker(mock_post):
+    mock_post.side_effect = requests.exceptions.ConnectionError("Connection refused")
+    registry = CircuitBreakerRegistry(min_calls=1)
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", circuit_breakers=registry)
+    firewalla.pause_rule("rule-1")
+    assert firewalla.resume_rule("rule-1") == {"error": "Circuit breaker open for rules endpoints"}
+    assert mock_post.call_count == 1
+@patch('requests.delete')
+@patch('requests.put')
+def test_put_and_delete_use_breakers(mock_put, mock_delete):
+    mock_put.return_value = make_response({"message": "unavailable"}, status_code=503)
+    mock_delete.side_effect = requests.exceptions.Timeout("Request timed out")
+    registry = CircuitBreakerRegistry(min_calls=1)
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", circuit_breakers=registry)
+    with pytest.raises(requests.exceptions.HTTPError):
+        firewalla.update_target_list("TL-1", name="list")
+    with pytest.raises(requests.exceptions.RequestException, match="Circuit breaker open for target-lists endpoints"):
+        firewalla.delete_target_list("TL-1")
+    mock_delete.assert_not_called()
+
+    with pytest.raises(requests.exceptions.Timeout):
+        firewalla.delete_alarm("box-1", "alarm-1")
+    with pytest.raises(requests.exceptions.RequestException, match="Circuit breaker open for alarms endpoints"):
+        firewalla.delete_alarm("box-1", "alarm-2")
+    assert mock_delete.call_count == 1
+    assert firewalla.breaker_states() == {"target-lists": "open", "alarms": "open"}
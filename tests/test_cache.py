@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+import time
+import pytest
+import requests
+from unittest.mock import patch
+from src.firewalla_unofficial_sdk.cache import DiskCache
+from src.firewalla_unofficial_sdk.main import Firewalla
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"))
+    yield cache
+    cache.close()
+
+def make_response(payload):
+    response = requests.Response()
+    response._content = json.dumps(payload).encode()
+    response.status_code = 200
+    return response
+
+def write_entries(path, worker):
+    cache = DiskCache(path)
+    for index in range(20):
+        cache.set(f"{worker}-{index}", "devices", f"payload {worker} {index}".encode())
+
+def test_get_and_set(cache):
+    assert cache.get("missing") is None
+    cache.set("key", "devices", b'[{"id": 1}]')
+    assert cache.get("key") == b'[{"id": 1}]'
+    assert cache.metrics == {"hits": 1, "misses": 1, "writes": 1, "evictions": 0, "invalidations": 0, "errors": 0}
+
+def test_entries_expire(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), default_ttl=60, ttls={"devices": 0.01})
+    cache.set("devices-key", "devices", b"[]")
+    cache.set("boxes-key", "boxes", b"[]")
+    time.sleep(0.02)
+    assert cache.get("devices-key") is None
+    assert cache.get("boxes-key") == b"[]"
+
+def test_key_depends_on_api_key_and_params(cache):
+    url = "https://test_subdomain.firewalla.net/v2/devices"
+    key = cache.key("key-1", url, {"box": "", "group": "1"})
+    assert key == cache.key("key-1", url, {"group": "1", "box": ""})
+    assert key != cache.key("key-2", url, {"box": "", "group": "1"})
+    assert key != cache.key("key-1", url, {"box": "", "group": "2"})
+
+def test_size_eviction_removes_least_recently_used(tmp_path):
+    payload = bytes(range(256)) * 40
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=len(payload) * 2 + 100, compression_level=0, touch_interval=0)
+    cache.set("first", "boxes", payload)
+    cache.set("second", "boxes", payload)
+    cache.get("first")
+    cache.set("third", "boxes", payload)
+    assert cache.get("second") is None
+    assert cache.get("first") == payload
+    assert cache.metrics["evictions"] == 1
+
+def test_hits_only_write_when_access_time_is_stale(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), default_ttl=60, touch_interval=0.05)
+    cache.set("key", "devices", b"[]")
+    connection = cache._connection()
+    changes = connection.total_changes
+    for _ in range(10):
+        assert cache.get("key") == b"[]"
+    assert connection.total_changes == changes
+    time.sleep(0.06)
+    assert cache.get("key") == b"[]"
+    assert connection.total_changes == changes + 1
+    assert not connection.in_transaction
+
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    DiskCache(path)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=write_entries, args=(path, worker)) for worker in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+    cache = DiskCache(path)
+    assert cache.get("2-19") == b"payload 2 19"
+
+@patch('requests.get')
+def test_client_serves_cached_responses(mock_get, cache):
+    mock_get.return_value = make_response([{"id": "device"}])
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", cache=cache)
+    assert firewalla.get_devices() == [{"id": "device"}]
+
+    # A new client, as in a new process, reads the cached response
+    other = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", cache=cache)
+    assert other.get_devices() == [{"id": "device"}]
+    assert mock_get.call_count == 1
+
+@patch('requests.get')
+def test_client_skips_uncached_endpoints_and_errors(mock_get, cache):
+    mock_get.return_value = make_response({"results": []})
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", cache=cache)
+    firewalla.get_flows()
+    firewalla.get_flows()
+    assert mock_get.call_count == 2
+
+    mock_get.side_effect = requests.exceptions.ConnectionError("Connection refused")
+    assert "error" in firewalla.get_boxes()
+    assert "error" in firewalla.get_boxes()
+    assert mock_get.call_count == 4
+
+def test_invalidate_removes_one_family(cache):
+    cache.set("lists", "target-lists", b"[]")
+    cache.set("list", "target-lists/1", b"{}")
+    cache.set("devices", "devices", b"[]")
+    assert cache.invalidate("target-lists") == 2
+    assert cache.get("lists") is None and cache.get("list") is None
+    assert cache.get("devices") == b"[]"
+    assert cache.metrics["invalidations"] == 2
+
+@patch('requests.delete')
+@patch('requests.post')
+@patch('requests.put')
+@patch('requests.get')
+def test_target_list_writes_invalidate_cache(mock_get, mock_put, mock_post, mock_delete, cache):
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", cache=cache)
+    other = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", cache=cache)
+    writes = [
+        (mock_put, lambda: firewalla.update_target_list(1, name="Renamed")),
+        (mock_post, lambda: firewalla.create_target_list("New", ["example.com"], "global")),
+        (mock_delete, lambda: firewalla.delete_target_list(1)),
+    ]
+    for version, (mock_write, write) in enumerate(writes):
+        cache.clear()
+        mock_get.return_value = make_response([{"id": 1, "name": f"v{version}"}])
+        # Cache the current lists, in this client and one sharing the file
+        assert firewalla.get_target_lists() == [{"id": 1, "name": f"v{version}"}]
+        assert other.get_target_list(1) == [{"id": 1, "name": f"v{version}"}]
+        mock_write.return_value = make_response({"id": 1})
+        write()
+        mock_get.return_value = make_response([{"id": 1, "name": "changed"}])
+        assert firewalla.get_target_lists() == [{"id": 1, "name": "changed"}]
+        assert other.get_target_list(1) == [{"id": 1, "name": "changed"}]
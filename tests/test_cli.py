@@ -0,0 +1,91 @@
+import base64
+import io
+import json
+import pytest
+import requests
+from unittest.mock import patch
+from src.firewalla_unofficial_sdk.cli import Progress, main
+
+def cursor(number):
+    return base64.b64encode(f"page-{number}".encode()).decode()
+
+def make_response(content):
+    response = requests.Response()
+    response._content = content
+    response.status_code = 200
+    return response
+
+def serve_pages(count, size=3):
+    """
+    Serve `count` flow pages; the page number is read back from the decoded cursor.
+    """
+    def get(url, headers=None, params=None, timeout=None):
+        number = int(params["cursor"].decode().split("-")[1]) if params.get("cursor") else 0
+        records = [{"ts": number * size + index, "device": {"name": f"device-{index}"}} for index in range(size)]
+        next_cursor = cursor(number + 1) if number + 1 < count else None
+        return make_response(json.dumps({"count": size, "results": records, "next_cursor": next_cursor}).encode())
+    return get
+
+@pytest.fixture
+def credentials(monkeypatch):
+    monkeypatch.setenv("FIREWALLA_API_KEY", "test_api_key")
+    monkeypatch.setenv("FIREWALLA_MSP_SUBDOMAIN", "test_subdomain")
+
+def test_export_flows_as_ndjson(credentials, capsys):
+    with patch("requests.get", side_effect=serve_pages(3)):
+        status = main(["export", "flows", "--fields", "ts,device.name", "--concurrency", "1", "--no-progress"])
+    assert status == 0
+    out = capsys.readouterr().out
+    records = [json.loads(line) for line in out.splitlines()]
+    assert [record["ts"] for record in records] == list(range(9))
+    assert records[1] == {"ts": 1, "device.name": "device-1"}
+
+def test_export_devices_as_csv(credentials, tmp_path):
+    devices = [{"id": "AA:BB:CC:DD:EE:01", "name": "Laptop", "network": {"name": "LAN"}}]
+    output = tmp_path / "devices.csv"
+    with patch("requests.get", return_value=make_response(json.dumps(devices).encode())) as mock_get:
+        assert main(["export", "devices", "--box", "box-1", "--format", "csv", "--output", str(output)]) == 0
+    assert mock_get.call_args.kwargs["params"] == {"box": "box-1", "group": ""}
+    lines = output.read_text().splitlines()
+    assert lines[0].startswith("id,gid,name,ip,")
+    assert lines[1].startswith("AA:BB:CC:DD:EE:01,,Laptop,")
+    assert ",LAN," in lines[1]
+
+def test_export_resumes_from_state_file(credentials, tmp_path, capsys):
+    output = tmp_path / "flows.csv"
+    state_file = tmp_path / "state.json"
+    arguments = ["export", "flows", "--format", "csv", "--fields", "ts", "--output", str(output),
+                 "--state-file", str(state_file), "--concurrency", "1"]
+    with patch("requests.get", side_effect=serve_pages(3)):
+        assert main(arguments + ["--max-pages", "2"]) == 0
+        assert json.loads(state_file.read_text()) == {
+            "endpoint": "flows", "cursor": cursor(2), "records": 6, "complete": False,
+        }
+        assert main(arguments) == 0
+    assert output.read_text().split() == ["ts"] + [str(ts) for ts in range(9)]
+    assert json.loads(state_file.read_text())["complete"] is True
+
+    assert main(arguments) == 0
+    assert "already complete" in capsys.readouterr().err
+    assert main(["export", "alarms", "--state-file", str(state_file)]) == 2
+
+def test_export_failure_exits_with_error(credentials, capsys):
+    with patch("requests.get", side_effect=requests.exceptions.ConnectionError("refused")):
+        assert main(["export", "devices"]) == 1
+    assert "Export failed: refused" in capsys.readouterr().err
+
+def test_missing_credentials(monkeypatch):
+    monkeypatch.delenv("FIREWALLA_API_KEY", raising=False)
+    monkeypatch.delenv("FIREWALLA_MSP_SUBDOMAIN", raising=False)
+    with pytest.raises(SystemExit) as exc_info:
+        main(["export", "flows"])
+    assert exc_info.value.code == 2
+
+def test_progress_line():
+    stream = io.StringIO()
+    progress = Progress("flows", stream, interval=0)
+    progress.update(1000, 2_000_000)
+    progress.finish()
+    lines = stream.getvalue().split("\r\033[K")
+    assert lines[1].startswith("flows: 1,000 records, 2.0 MB in ")
+    assert "records/s" in lines[2] and "MB/s" in lines[2] and lines[2].endswith("\n")
@@ -0,0 +1,150 @@
+import json
+import time
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from src.firewalla_unofficial_sdk.enrichment import FlowEnricher
+from src.firewalla_unofficial_sdk.main import Firewalla
+from src.firewalla_unofficial_sdk.matcher import TargetListMatcher
+
+BOXES = [{"gid": "box-1", "name": "Office", "group": {"id": "g1", "name": "HQ"}}]
+DEVICES = [
+    {"id": "aa:bb:cc:dd:ee:ff", "gid": "box-1", "ip": "192.168.1.10", "name": "Laptop"},
+    {"id": "11:22:33:44:55:66", "gid": "box-1", "ip": "192.168.1.11", "name": "Phone"},
+]
+TARGET_LISTS = [
+    {"id": "TL-1", "name": "Ads", "targets": ["ads.example.com", "10.0.0.1"]},
+    {"id": "TL-2", "name": "Trackers", "targets": ["ads.example.com"]},
+]
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.get_boxes.return_value = BOXES
+    client.get_devices.return_value = DEVICES
+    client.get_target_lists.return_value = TARGET_LISTS
+    return client
+
+def test_enrich_flow(client):
+    enricher = FlowEnricher(client)
+    flow = {
+        "gid": "box-1",
+        "device": {"id": "AA:BB:CC:DD:EE:FF"},
+        "destination": {"name": "ads.example.com", "ip": "10.0.0.1"},
+    }
+    enriched = enricher.enrich_flow(flow)
+    assert enriched["enrichment"] == {
+        "boxName": "Office",
+        "boxGroup": "HQ",
+        "deviceName": "Laptop",
+        "targetLists": ["TL-1", "TL-2"],
+    }
+    assert "enrichment" not in flow
+
+def test_enrich_falls_back_to_device_ip(client):
+    enricher = FlowEnricher(client)
+    flow = {"gid": "box-1", "device": {"ip": "192.168.1.11"}, "destination": {"ip": "8.8.8.8"}}
+    enriched = enricher.enrich_flow(flow)
+    assert enriched["enrichment"]["deviceName"] == "Phone"
+    assert enriched["enrichment"]["targetLists"] == []
+
+def test_enrich_page_and_stream(client):
+    enricher = FlowEnricher(client)
+    page = {"count": 2, "results": [{"gid": "box-1"}, {"gid": "unknown"}], "next_cursor": "abc"}
+    enriched = enricher.enrich_page(page)
+    assert enriched["next_cursor"] == "abc"
+    assert [f["enrichment"]["boxName"] for f in enriched["results"]] == ["Office", None]
+
+    flows = list(enricher.enrich([page, {"gid": "box-1"}]))
+    assert len(flows) == 3
+    client.get_boxes.assert_called_once()
+
+def test_enrich_page_error_passthrough(client):
+    enricher = FlowEnricher(client)
+    assert enricher.enrich_page({"error": "Timeout occurred"}) == {"error": "Timeout occurred"}
+
+def test_stale_tables_refresh_in_background(client):
+    enricher = FlowEnricher(client, ttl=0)
+    first = enricher.refresh()
+    client.get_boxes.return_value = [{"gid": "box-1", "name": "Renamed"}]
+
+    # The stale snapshot is used while the refresh runs
+    assert enricher.enrich_flow({"gid": "box-1"})["enrichment"]["boxName"] == "Office"
+    deadline = time.monotonic() + 2
+    while enricher.tables is first and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert enricher.enrich_flow({"gid": "box-1"})["enrichment"]["boxName"] == "Renamed"
+
+def test_refresh_error_keeps_previous_tables(client):
+    enricher = FlowEnricher(client)
+    tables = enricher.refresh()
+    client.get_devices.return_value = {"error": "ConnectionError occurred: refused"}
+    assert enricher.refresh() is tables
+    assert enricher.last_error == "ConnectionError occurred: refused"
+
+def test_refresh_only_reloads_changed_target_lists(client):
+    enricher = FlowEnricher(client)
+    first = enricher.refresh()
+    client.get_target_lists.return_value = [
+        {"id": "TL-1", "name": "Ads", "targets": ["ads.example.com", "10.0.0.1"]},
+        {"id": "TL-3", "name": "Malware", "targets": ["bad.example.net"]},
+    ]
+    with patch.object(TargetListMatcher, "update_list", autospec=True, side_effect=TargetListMatcher.update_list) as update_list:
+        tables = enricher.refresh()
+    assert [call.args[1]["id"] for call in update_list.call_args_list] == ["TL-3"]
+    assert tables.matcher is first.matcher
+    assert tables.match_targets("ads.example.com") == ["TL-1"]
+    assert tables.match_targets("bad.example.net") == ["TL-3"]
+
+    client.get_target_lists.return_value = [{"id": "TL-1", "targets": ["10.0.0.1"], "lastUpdated": 2}]
+    tables = enricher.refresh()
+    assert tables.match_targets("ads.example.com") == []
+    assert tables.match_targets("10.0.0.1") == ["TL-1"]
+    assert tables.match_targets("bad.example.net") == []
+
+def test_failed_first_load_is_not_retried_per_flow(client):
+    client.get_boxes.return_value = {"error": "Received a 503 error with an empty body."}
+    enricher = FlowEnricher(client, retry_delay=60)
+    flows = [{"gid": "box-1"} for _ in range(100)]
+    assert [flow["enrichment"] for flow in enricher.enrich_batch(flows)] == [None] * 100
+    assert [flow["enrichment"] for flow in enricher.enrich_batch(flows)] == [None] * 100
+    assert client.get_boxes.call_count == 1
+    assert enricher.last_error == "Received a 503 error with an empty body."
+
+    # Once the retry delay has passed the next batch loads the tables again
+    client.get_boxes.return_value = BOXES
+    enricher.failed_at -= 60
+    assert enricher.enrich_batch(flows[:1])[0]["enrichment"]["boxName"] == "Office"
+    assert client.get_boxes.call_count == 2
+
+@patch('requests.get')
+def test_enrich_response_models(mock_get):
+    payloads = {
+        "boxes": BOXES,
+        "devices": DEVICES,
+        "target-lists": TARGET_LISTS,
+        "flows": {"count": 1, "results": [
+            {"gid": "box-1", "category": None, "device": {"id": "AA:BB:CC:DD:EE:FF"}, "destination": {"name": "ads.example.com"}},
+        ], "next_cursor": None},
+    }
+
+    def respond(url, headers, params, timeout):
+        response = requests.Response()
+        response._content = json.dumps(payloads[url.rsplit("/", 1)[1]]).encode()
+        response.status_code = 200
+        return response
+
+    mock_get.side_effect = respond
+    client = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", response_models=True)
+    enricher = FlowEnricher(client)
+    page = enricher.enrich_page(client.get_flows())
+    flow = page["results"][0]
+    assert flow["device"] == {"id": "AA:BB:CC:DD:EE:FF"}
+    assert flow["enrichment"] == {
+        "boxName": "Office", "boxGroup": "HQ", "deviceName": "Laptop", "targetLists": ["TL-1", "TL-2"],
+    }
+    assert list(enricher.enrich(client.get_flows()["results"]))[0]["enrichment"]["deviceName"] == "Laptop"
+
+    # Enriched models match enriched dicts, explicit nulls included
+    dict_client = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain")
+    assert FlowEnricher(dict_client).enrich_page(dict_client.get_flows()) == page
@@ -0,0 +1,131 @@
+import json
+import time
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from src.firewalla_unofficial_sdk.export import ExportPipeline, decode_page, encode_records, find_cursor
+from src.firewalla_unofficial_sdk.breaker import CircuitBreakerRegistry
+from src.firewalla_unofficial_sdk.main import Firewalla
+
+def page(start, count, cursor):
+    return json.dumps({
+        "count": count,
+        "results": [{"ts": index, "device": {"name": f"device-{index}"}, "block": index % 2 == 0}
+                    for index in range(start, start + count)],
+        "next_cursor": cursor,
+    }).encode()
+
+def blocked(record):
+    return record["block"]
+
+def repeat(records):
+    return records * 1000
+
+def make_client(pages):
+    client = MagicMock()
+    client.get_raw.side_effect = pages
+    return client
+
+def test_find_cursor():
+    assert find_cursor(page(0, 2, "abc")) == "abc"
+    assert find_cursor(page(0, 2, None)) is None
+    assert find_cursor(b'[{"ts": 1}]') is None
+
+def test_decode_page():
+    content = page(0, 4, None)
+    assert [r["ts"] for r in decode_page(content, record_filter=blocked)] == [0, 2]
+    assert decode_page(content, fields=["ts", "device.name", "missing.key"])[1] == (1, "device-1", None)
+
+def test_encode_records():
+    records = [(1, "a,b"), (2, None)]
+    assert encode_records(records, "ndjson", ["ts", "name"]) == b'{"ts":1,"name":"a,b"}\n{"ts":2,"name":null}\n'
+    assert encode_records(records, "csv") == b'1,"a,b"\r\n2,\r\n'
+    assert encode_records([{"ts": 1}], "ndjson") == b'{"ts":1}\n'
+
+def test_pipeline_preserves_order():
+    client = make_client([page(index * 10, 10, f"cursor-{index}" if index < 4 else None) for index in range(5)])
+    pipeline = ExportPipeline(client, "flows", params={"limit": 10}, fields=["ts"], workers=2, prefetch=2)
+    assert [record for (record,) in pipeline] == list(range(50))
+    assert pipeline.pages_fetched == 5
+    assert pipeline.cursor is None
+    cursors = [call.kwargs["params"]["cursor"] for call in client.get_raw.call_args_list]
+    assert cursors == [None, "cursor-0", "cursor-1", "cursor-2", "cursor-3"]
+
+def test_pipeline_batches_report_cursor():
+    client = make_client([page(0, 3, "next"), page(3, 3, None)])
+    batches = list(ExportPipeline(client, "alarms", record_filter=blocked, workers=1).batches())
+    assert [([r["ts"] for r in records], cursor) for records, cursor in batches] == [([0, 2], "next"), ([4], None)]
+
+def test_pipeline_encodes_batches_in_workers():
+    client = make_client([page(0, 2, "next"), page(2, 2, None)])
+    pipeline = ExportPipeline(client, "flows", fields=["ts", "device.name"], workers=1, encoding="csv")
+    assert list(pipeline.batches()) == [(b"0,device-0\r\n1,device-1\r\n", "next"), (b"2,device-2\r\n3,device-3\r\n", None)]
+    assert pipeline.records_exported == 4
+
+    client = make_client([page(0, 2, None)])
+    pipeline = ExportPipeline(client, "flows", fields=["ts"], workers=1, encoding="ndjson")
+    assert list(pipeline) == [b'{"ts":0}\n{"ts":1}\n']
+
+def test_pipeline_batches_larger_than_the_page():
+    client = make_client([page(0, 2, None)])
+    pipeline = ExportPipeline(client, "flows", fields=["ts"], transform=repeat, workers=1)
+    assert [record for (record,) in pipeline] == [0, 1] * 1000
+    assert pipeline.records_exported == 2000
+
+def test_pipeline_resumes_and_stops():
+    client = make_client([page(0, 2, "b"), page(2, 2, "c")])
+    pipeline = ExportPipeline(client, "flows", params={"cursor": "a"}, workers=1, max_pages=2)
+    assert len(list(pipeline)) == 4
+    assert client.get_raw.call_args_list[0].kwargs["params"]["cursor"] == "a"
+    assert pipeline.cursor == "c"
+
+def test_pipeline_rate_limit():
+    client = make_client([page(index, 1, f"cursor-{index}" if index < 3 else None) for index in range(4)])
+    pipeline = ExportPipeline(client, "flows", fields=["ts"], workers=1, rate_limit=20)
+    start = time.monotonic()
+    assert [record for (record,) in pipeline] == [0, 1, 2, 3]
+    # Four pages at 20 per second: the last one is requested at least 0.15 seconds after the first
+    assert time.monotonic() - start >= 0.15
+
+def test_pipeline_propagates_fetch_errors():
+    client = make_client([page(0, 2, "b"), requests.exceptions.Timeout("timed out")])
+    with pytest.raises(requests.exceptions.Timeout):
+        list(ExportPipeline(client, "flows", workers=1))
+
+@patch('requests.get')
+def test_get_raw(mock_get):
+    response = requests.Response()
+    response._content = b'{"results": []}'
+    response.status_code = 200
+    mock_get.return_value = response
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain")
+    assert firewalla.get_raw("flows", params={"limit": 10, "cursor": None}) == b'{"results": []}'
+    assert mock_get.call_args.kwargs["params"] == {"limit": 10, "cursor": ""}
+
+    response.status_code = 500
+    with pytest.raises(requests.exceptions.HTTPError):
+        firewalla.get_raw("flows")
+
+@patch('requests.get')
+def test_get_raw_respects_circuit_breaker(mock_get):
+    response = requests.Response()
+    response._content = b""
+    response.status_code = 503
+    mock_get.return_value = response
+    breakers = CircuitBreakerRegistry(min_calls=2, reset_timeout=60)
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", circuit_breakers=breakers)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            firewalla.get_raw("flows")
+    assert firewalla.breaker_states() == {"flows": "open"}
+
+    pipeline = firewalla.export("flows", workers=1)
+    with pytest.raises(requests.exceptions.RequestException, match="Circuit breaker open for flows endpoints"):
+        list(pipeline)
+    assert mock_get.call_count == 2
+
+def test_export_returns_pipeline():
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain")
+    pipeline = firewalla.export("alarms", params={"query": "type:1"}, workers=3)
+    assert pipeline.endpoint == "alarms"
+    assert pipeline.workers == 3
@@ -1,8 +1,10 @@
 import pytest
 import requests
 import json
+import time
 from unittest.mock import patch
 from src.firewalla_unofficial_sdk.main import Firewalla, AlarmParams, StatsParams, SimpleStatsParams
+from src.firewalla_unofficial_sdk.models import Box, Device, TrendPoint
 
 @pytest.fixture
 def firewalla_instance():
@@ -442,3 +444,62 @@ def test_get_cursor_base64_decoding(mock_get, firewalla_instance):
     # Verify the cursor was decoded
     called_args = mock_get.call_args[1]
     assert called_args["params"]["cursor"] == b"Hello World"
+
+@patch('requests.get')
+def test_snapshot(mock_get, firewalla_instance):
+    def respond(url, headers, params, timeout):
+        if url.endswith("trends/rules"):
+            raise requests.exceptions.ConnectionError("Connection refused")
+        response = requests.Response()
+        response._content = json.dumps({"url": url}).encode()
+        response.status_code = 200
+        return response
+
+    mock_get.side_effect = respond
+    snapshot = firewalla_instance.snapshot(deadline=5)
+    sections = snapshot["sections"]
+    assert snapshot["complete"]
+    assert len(sections) == 9
+    assert sections["boxes"]["data"] == {"url": "https://test_subdomain.firewalla.net/v2/boxes"}
+    assert sections["stats.topRegionsByBlockedFlows"]["status"] == "ok"
+    assert sections["rule_trends"] == {
+        "status": "error",
+        "data": None,
+        "error": "ConnectionError occurred: Connection refused",
+        "elapsed": sections["rule_trends"]["elapsed"],
+    }
+    assert all(call.kwargs["timeout"] == 5 for call in mock_get.call_args_list)
+
+@patch('requests.get')
+def test_snapshot_deadline(mock_get, firewalla_instance):
+    def respond(url, headers, params, timeout):
+        if url.endswith("devices"):
+            time.sleep(0.5)
+        response = requests.Response()
+        response._content = b"[]"
+        response.status_code = 200
+        return response
+
+    mock_get.side_effect = respond
+    snapshot = firewalla_instance.snapshot(deadline=0.1)
+    assert not snapshot["complete"]
+    assert snapshot["elapsed"] < 0.5
+    assert snapshot["sections"]["devices"]["status"] == "timeout"
+    assert snapshot["sections"]["boxes"]["status"] == "ok"
+
+@patch('requests.get')
+def test_snapshot_response_models(mock_get):
+    def respond(url, headers, params, timeout):
+        payload = {"results": [{"ts": 1700000000, "value": 3}]} if "trends" in url else [{"gid": "box-1", "id": "AA"}]
+        response = requests.Response()
+        response._content = json.dumps(payload).encode()
+        response.status_code = 200
+        return response
+
+    mock_get.side_effect = respond
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", response_models=True)
+    sections = firewalla.snapshot(deadline=5)["sections"]
+    assert isinstance(sections["boxes"]["data"][0], Box)
+    assert isinstance(sections["devices"]["data"][0], Device)
+    assert isinstance(sections["flow_trends"]["data"]["results"][0], TrendPoint)
+    assert sections["simple_stats"]["data"] == [{"gid": "box-1", "id": "AA"}]
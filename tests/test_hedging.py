@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+import pytest
+import requests
+from unittest.mock import patch
+from src.firewalla_unofficial_sdk.hedging import HedgePolicy
+from src.firewalla_unofficial_sdk.main import Firewalla
+
+def make_response(payload):
+    response = requests.Response()
+    response._content = json.dumps(payload).encode()
+    response.status_code = 200
+    return response
+
+def test_fast_request_is_not_hedged():
+    policy = HedgePolicy(delay=1, max_hedge_ratio=1)
+    assert policy.execute(lambda: "ok") == "ok"
+    assert policy.metrics["hedges_fired"] == 0
+    assert policy.metrics["requests"] == 1
+
+def test_slow_request_is_hedged():
+    calls = []
+
+    def send():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    policy = HedgePolicy(delay=0.01, max_hedge_ratio=1)
+    assert policy.execute(send) == "fast"
+    assert policy.metrics["hedges_fired"] == 1
+    assert policy.metrics["hedges_won"] == 1
+
+def test_failed_attempt_waits_for_the_other():
+    calls = []
+
+    def send():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.05)
+            return "primary"
+        raise requests.exceptions.ConnectionError("refused")
+
+    policy = HedgePolicy(delay=0.01, max_hedge_ratio=1)
+    assert policy.execute(send) == "primary"
+    assert policy.metrics["hedges_won"] == 0
+
+def test_all_attempts_fail():
+    def send():
+        time.sleep(0.02)
+        raise requests.exceptions.Timeout("timed out")
+
+    policy = HedgePolicy(delay=0.01, max_hedge_ratio=1)
+    with pytest.raises(requests.exceptions.Timeout):
+        policy.execute(send)
+
+def test_hedge_ratio_caps_extra_load():
+    policy = HedgePolicy(delay=0, max_hedge_ratio=0.5)
+    gate = threading.Event()
+
+    def send():
+        gate.wait(0.02)
+        return "ok"
+
+    for _ in range(4):
+        policy.execute(send)
+    assert policy.metrics["hedges_fired"] == 2
+    assert policy.metrics["hedges_skipped"] == 2
+
+def test_tracked_delay_uses_percentile():
+    policy = HedgePolicy(percentile=0.5, min_samples=3, initial_delay=2, min_delay=0)
+    assert policy.hedge_delay() == 2
+    policy.latencies.extend([0.1, 0.2, 0.3, 0.4])
+    assert policy.hedge_delay() == 0.3
+
+@patch('requests.get')
+def test_get_uses_hedge_policy(mock_get):
+    mock_get.return_value = make_response({"status": "success"})
+    policy = HedgePolicy(delay=1)
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", hedge_policy=policy)
+    assert firewalla.get_devices() == {"status": "success"}
+    assert policy.metrics["requests"] == 1
+    mock_get.assert_called_once()
+
+@patch('requests.get')
+def test_get_hedge_errors_are_returned(mock_get):
+    mock_get.side_effect = requests.exceptions.ConnectionError("Connection refused")
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", hedge_policy=HedgePolicy(delay=1))
+    assert firewalla.get_devices() == {"error": "ConnectionError occurred: Connection refused"}
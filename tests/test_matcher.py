@@ -0,0 +1,98 @@
+import os
+import pytest
+import subprocess
+import sys
+from src.firewalla_unofficial_sdk.matcher import TargetListMatcher, MappedTargetListMatcher, parse_target
+
+TARGET_LISTS = [
+    {"id": "TL-1", "targets": ["example.com", "10.0.0.0/8", "2001:db8::/32"]},
+    {"id": "TL-2", "targets": ["*.tracker.net", "192.168.1.5"]},
+    {"id": "TL-3", "targets": ["ads.example.com", "10.1.0.0/16", "not/a/target"]},
+]
+
+CASES = [
+    ("example.com", {"TL-1"}),
+    ("EXAMPLE.com.", {"TL-1"}),
+    ("ads.example.com", {"TL-1", "TL-3"}),
+    ("www.ads.example.com", {"TL-1", "TL-3"}),
+    ("badexample.com", set()),
+    ("tracker.net", set()),
+    ("cdn.tracker.net", {"TL-2"}),
+    ("10.2.3.4", {"TL-1"}),
+    ("10.1.3.4", {"TL-1", "TL-3"}),
+    ("192.168.1.5", {"TL-2"}),
+    ("192.168.1.6", set()),
+    ("2001:db8::1", {"TL-1"}),
+    ("2001:db9::1", set()),
+]
+
+@pytest.fixture
+def matcher():
+    return TargetListMatcher(TARGET_LISTS)
+
+def test_parse_target():
+    assert parse_target("*.Example.com") == ("wildcard", "example.com")
+    assert parse_target("example.com.") == ("domain", "example.com")
+    assert parse_target("10.0.0.1")[0] == "ip"
+    assert parse_target("10.0.0.1/33")[0] == "invalid"
+
+@pytest.mark.parametrize("host,expected", CASES)
+def test_match(matcher, host, expected):
+    assert matcher.match(host) == expected
+
+def test_update_list_replaces_entries(matcher):
+    matcher.update_list({"id": "TL-1", "targets": ["example.org"]})
+    assert matcher.match("example.com") == set()
+    assert matcher.match("10.2.3.4") == set()
+    assert matcher.match("www.example.org") == {"TL-1"}
+    assert matcher.match("ads.example.com") == {"TL-3"}
+
+def test_remove_list_prunes_nodes(matcher):
+    for list_id in ("TL-1", "TL-2", "TL-3"):
+        matcher.remove_list(list_id)
+    assert matcher.domains.children == {}
+    assert matcher.prefixes[4].children == [None, None]
+    assert matcher.prefixes[6].children == [None, None]
+
+@pytest.mark.parametrize("host,expected", CASES)
+def test_mapped_matcher(matcher, tmp_path, host, expected):
+    path = tmp_path / "targets.bin"
+    matcher.save(str(path))
+    with MappedTargetListMatcher(str(path)) as mapped:
+        assert mapped.match(host) == expected
+
+def test_mapped_matcher_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a matcher file")
+    with pytest.raises(ValueError):
+        MappedTargetListMatcher(str(path))
+
+def test_mapped_matcher_rejects_truncated_files(matcher, tmp_path):
+    path = tmp_path / "targets.bin"
+    matcher.save(str(path))
+    path.write_bytes(path.read_bytes()[:-40])
+    with pytest.raises(ValueError):
+        MappedTargetListMatcher(str(path))
+
+def test_save_replaces_file_under_mapped_readers(matcher, tmp_path):
+    path = tmp_path / "targets.bin"
+    TargetListMatcher([{"id": "TL-BIG", "targets": [f"host{index}.example.org" for index in range(5000)]}]).save(str(path))
+    # Run the reader in a child so a SIGBUS from a truncated mapping fails the test instead of killing pytest
+    script = f"""
+import sys
+sys.path.insert(0, {os.path.abspath("src")!r})
+from firewalla_unofficial_sdk.matcher import TargetListMatcher, MappedTargetListMatcher
+mapped = MappedTargetListMatcher({str(path)!r})
+assert mapped.match("host4999.example.org") == {{"TL-BIG"}}
+TargetListMatcher([{{"id": "TL-SMALL", "targets": ["example.com"]}}]).save({str(path)!r})
+# The open mapping still reads the old file
+assert mapped.match("host4999.example.org") == {{"TL-BIG"}}
+assert mapped.match("example.com") == set()
+mapped.close()
+with MappedTargetListMatcher({str(path)!r}) as reopened:
+    assert reopened.match("example.com") == {{"TL-SMALL"}}
+    assert reopened.match("host4999.example.org") == set()
+"""
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert [entry.name for entry in tmp_path.iterdir()] == ["targets.bin"]
@@ -0,0 +1,103 @@
+import json
+import pytest
+import requests
+from collections.abc import Mapping
+from unittest.mock import patch
+from src.firewalla_unofficial_sdk.main import Firewalla
+from src.firewalla_unofficial_sdk.models import Alarm, Box, Device, Flow, Host, Reference, Rule, TrendPoint, decode
+
+FLOW = {
+    "ts": 1700000000.5,
+    "gid": "box-1",
+    "protocol": "tcp",
+    "direction": "outbound",
+    "block": False,
+    "download": 1024,
+    "upload": 512,
+    "device": {"id": "AA:BB:CC:DD:EE:FF", "ip": "192.168.1.10", "name": "Laptop", "network": {"id": "n1", "name": "LAN"}},
+    "destination": {"name": "example.com", "ip": "93.184.216.34", "port": 443},
+    "sigs": ["custom"],
+}
+
+def make_response(payload):
+    response = requests.Response()
+    response._content = json.dumps(payload).encode()
+    response.status_code = 200
+    return response
+
+def test_scalar_fields_and_lazy_nested():
+    flow = Flow(FLOW)
+    assert flow.ts == 1700000000.5
+    assert flow.block is False
+    assert flow.source is None
+    assert isinstance(flow._device, dict)
+    device = flow.device
+    assert isinstance(device, Host)
+    assert flow.device is device
+    assert device.network == Reference({"id": "n1", "name": "LAN"})
+    assert flow.destination.port == 443
+
+def test_models_use_slots():
+    flow = Flow(FLOW)
+    assert not hasattr(flow, "__dict__")
+
+def test_dict_style_access_and_round_trip():
+    flow = Flow(FLOW)
+    assert flow["gid"] == "box-1"
+    assert flow.get("sigs") == ["custom"]
+    assert flow.get("category", "none") == "none"
+    assert flow.to_dict() == FLOW
+
+def test_lazy_nested_and_missing():
+    rule = Rule({"id": "r1", "action": "block", "target": {"type": "domain", "value": "example.com", "dnsOnly": True}})
+    assert rule.target.dns_only is True
+
+    box = Box({"gid": "box-1", "group": None})
+    assert box.group is None
+
+def test_models_are_read_only_mappings():
+    flow = Flow({"ts": 1, "download": 0, "device": {"id": "AA", "name": "Laptop"}, "custom": "x"})
+    assert isinstance(flow, Mapping)
+    assert list(flow) == ["ts", "download", "device", "custom"]
+    assert len(flow) == 4 and "device" in flow and "upload" not in flow
+    assert dict(flow)["device"].name == "Laptop"
+    assert {**flow}["custom"] == "x"
+    with pytest.raises(TypeError):
+        flow["ts"] = 2
+
+def test_explicit_nulls_are_kept():
+    device = Device({"id": "a", "name": None, "network": None})
+    assert "name" in device and "network" in device and "ip" not in device
+    assert device.name is None and device.ip is None
+    assert device["name"] is None and device.get("name", "x") is None
+    assert device.get("ip", "x") == "x"
+    with pytest.raises(KeyError):
+        device["ip"]
+    assert list(device) == ["id", "name", "network"] and len(device) == 3
+    assert device.to_dict() == {"id": "a", "name": None, "network": None}
+    assert device != Device({"id": "a"})
+
+def test_decode_shapes():
+    assert decode({"error": "Timeout occurred"}, Alarm) == {"error": "Timeout occurred"}
+    page = decode({"count": 1, "results": [{"aid": 1}], "next_cursor": "x"}, Alarm)
+    assert page["next_cursor"] == "x"
+    assert page["results"][0].aid == 1
+    assert decode([{"ts": 1, "value": 2}], TrendPoint)[0].value == 2
+    assert decode({"aid": 2}, Alarm).aid == 2
+
+@patch('requests.get')
+def test_response_models_mode(mock_get):
+    mock_get.return_value = make_response({"count": 1, "results": [FLOW]})
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain", response_models=True)
+    flows = firewalla.get_flows()
+    assert isinstance(flows["results"][0], Flow)
+    assert flows["results"][0].device.name == "Laptop"
+
+    mock_get.return_value = make_response([{"gid": "box-1", "name": "Office"}])
+    assert firewalla.get_boxes()[0].name == "Office"
+
+@patch('requests.get')
+def test_response_models_disabled_by_default(mock_get):
+    mock_get.return_value = make_response([{"gid": "box-1"}])
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain")
+    assert firewalla.get_boxes() == [{"gid": "box-1"}]
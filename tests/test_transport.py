@@ -0,0 +1,108 @@
+import json
+import pytest
+import requests
+from unittest.mock import patch
+from src.firewalla_unofficial_sdk import transport as transport_module
+from src.firewalla_unofficial_sdk.main import Firewalla
+from src.firewalla_unofficial_sdk.transport import Http2Transport
+
+httpx = pytest.importorskip("httpx")
+
+def mock_transport(handler):
+    transport = Http2Transport()
+    transport.client.close()
+    transport.client = transport.http1_client = httpx.Client(transport=httpx.MockTransport(handler))
+    return transport
+
+def test_get_goes_through_the_transport():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json=[{"id": "AA:BB:CC:DD:EE:01"}])
+
+    transport = mock_transport(handler)
+    client = Firewalla("test_api_key", "test_subdomain", transport=transport)
+    with patch("requests.get") as mock_get:
+        devices = client.get_devices(box="box-1")
+    mock_get.assert_not_called()
+    assert devices == [{"id": "AA:BB:CC:DD:EE:01"}]
+    assert seen[0].headers["Authorization"] == "Token test_api_key"
+    assert transport.metrics["responses"] == {"HTTP/1.1": 1}
+
+def test_params_are_encoded_like_requests():
+    seen = []
+    transport = mock_transport(lambda request: seen.append(str(request.url)) or httpx.Response(200, json={}))
+    params = {"query": "status:active box:1", "cursor": b"\x00\xff", "limit": ""}
+    transport.get("https://test_subdomain.firewalla.net/v2/alarms", params=params)
+    expected = requests.PreparedRequest()
+    expected.prepare_url("https://test_subdomain.firewalla.net/v2/alarms", params)
+    assert seen == [expected.url]
+
+def test_post_sends_json():
+    seen = []
+
+    def handler(request):
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json={"id": "1"})
+
+    client = Firewalla("test_api_key", "test_subdomain", transport=mock_transport(handler))
+    assert client.create_target_list("list", ["example.com"], "global") == {"id": "1"}
+    assert seen[0]["targets"] == ["example.com"]
+
+def test_http_error_becomes_error_response():
+    client = Firewalla(
+        "test_api_key", "test_subdomain", transport=mock_transport(lambda request: httpx.Response(503, text="down"))
+    )
+    assert client.get_boxes() == {"error": "HTTP Request Error occurred: down"}
+
+def test_exceptions_are_mapped_to_requests_exceptions():
+    def handler(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    transport = mock_transport(handler)
+    with pytest.raises(requests.exceptions.Timeout):
+        transport.get("https://test_subdomain.firewalla.net/v2/boxes")
+    client = Firewalla("test_api_key", "test_subdomain", transport=transport)
+    assert client.get_boxes() == {"error": "Timeout occurred: timed out"}
+
+    def refused(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client = Firewalla("test_api_key", "test_subdomain", transport=mock_transport(refused))
+    assert client.get_boxes() == {"error": "ConnectionError occurred: refused"}
+
+def test_http1_origins_move_to_the_larger_pool():
+    seen = []
+    transport = Http2Transport(max_connections=2, http1_connections=8)
+    assert transport.http2 is True
+    transport.client.close()
+    transport.client = httpx.Client(transport=httpx.MockTransport(lambda request: seen.append("default") or httpx.Response(200)))
+    transport.get("https://test_subdomain.firewalla.net/v2/boxes")
+    pool = transport.http1_client._transport._pool
+    assert (pool._max_connections, pool._max_keepalive_connections) == (8, 8)
+    assert not pool._http2
+
+    transport.http1_client.close()
+    transport.http1_client = httpx.Client(transport=httpx.MockTransport(lambda request: seen.append("http1") or httpx.Response(200)))
+    transport.get("https://test_subdomain.firewalla.net/v2/devices")
+    transport.get("https://other.firewalla.net/v2/boxes")
+    assert seen == ["default", "http1", "default"]
+    transport.close()
+
+def test_falls_back_to_http1_without_httpx():
+    with patch.object(transport_module, "httpx", None):
+        transport = Http2Transport()
+        assert transport.http2 is False
+        assert isinstance(transport.client, requests.Session)
+        response = requests.Response()
+        response._content = b"[]"
+        response.status_code = 200
+        with patch.object(transport.client, "request", return_value=response) as mock_request:
+            assert transport.get("https://test_subdomain.firewalla.net/v2/boxes", timeout=5) is response
+        mock_request.assert_called_once_with(
+            "GET", "https://test_subdomain.firewalla.net/v2/boxes", headers=None, params=None, json=None, timeout=5
+        )
+        assert transport.metrics == {"http2": False, "responses": {"HTTP/1.1": 1}}
+        with pytest.raises(ImportError):
+            Http2Transport(http1=False)
@@ -0,0 +1,68 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+from src.firewalla_unofficial_sdk.trends import TrendSeries, TrendStore
+
+def test_merge_appends_and_dedupes():
+    series = TrendSeries([(0, 1), (60, 2)])
+    assert series.merge([(60, 5), (120, 3)]) == 1
+    assert series.points() == [(0, 1), (60, 5), (120, 3)]
+
+def test_merge_out_of_order_points():
+    series = TrendSeries([(0, 1), (120, 3)])
+    assert series.merge([(60, 2), (30, 4)]) == 2
+    assert series.points() == [(0, 1), (30, 4), (60, 2), (120, 3)]
+
+def test_merge_api_response():
+    series = TrendSeries()
+    assert series.merge([{"ts": 60, "value": 2}, {"ts": 0, "value": 1}]) == 2
+    assert series.merge({"results": [{"ts": 120, "value": 3}]}) == 1
+    assert series.points() == [(0, 1), (60, 2), (120, 3)]
+
+def test_merge_list_pairs():
+    series = TrendSeries()
+    assert series.merge(json.loads(json.dumps([(0, 1), (60, 2)]))) == 2
+    assert series.merge([[60, 3]]) == 0
+    assert series.points() == [(0, 1), (60, 3)]
+
+def test_resample():
+    series = TrendSeries([(0, 1), (30, 2), (60, 3), (200, 4)])
+    assert series.resample(60) == [(0, 3), (60, 3), (180, 4)]
+    assert series.resample(60, "mean") == [(0, 1.5), (60, 3), (180, 4)]
+    assert series.resample(60, "rate") == [(0, 0.05), (60, 0.05), (180, 4 / 60)]
+    assert series.resample(60, "count", fill=0) == [(0, 2), (60, 1), (120, 0), (180, 1)]
+    assert series.resample(60, "max", start=30, end=200) == [(0, 2), (60, 3)]
+    assert series.resample(60, "last") == [(0, 2), (60, 3), (180, 4)]
+    with pytest.raises(ValueError):
+        series.resample(0)
+
+def test_resample_after_merge_uses_new_points():
+    series = TrendSeries([(0, 1)])
+    assert series.resample(60) == [(0, 1)]
+    series.merge([(10, 5)])
+    assert series.resample(60) == [(0, 6)]
+
+def test_downsample():
+    series = TrendSeries((ts, 1) for ts in range(0, 1000, 10))
+    points = series.downsample(7, "sum")
+    assert len(points) <= 7
+    assert sum(value for _, value in points) == 100
+    assert series.downsample(200) == series.points()
+
+def test_rolling():
+    series = TrendSeries([(0, 1), (30, 2), (60, 3), (90, 4)])
+    assert series.rolling(60) == [(0, 1), (30, 3), (60, 5), (90, 7)]
+    assert series.rolling(60, "count") == [(0, 1), (30, 2), (60, 2), (90, 2)]
+
+def test_store_refresh():
+    client = MagicMock()
+    client.get_flow_trends.return_value = [{"ts": 0, "value": 10}, {"ts": 60, "value": 20}]
+    client.get_alarm_trends.return_value = {"error": "Timeout occurred: timed out"}
+    client.get_rule_trends.return_value = []
+    store = TrendStore(client)
+    assert store.refresh() == {"flows": 2, "alarms": "Timeout occurred: timed out", "rules": 0}
+
+    client.get_flow_trends.return_value = [{"ts": 60, "value": 20}, {"ts": 120, "value": 30}]
+    assert store.refresh("flows") == {"flows": 1}
+    assert store["flows"].resample(120) == [(0, 30), (120, 30)]
+    client.get_alarm_trends.assert_called_once()
@@ -0,0 +1,122 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from src.firewalla_unofficial_sdk.main import Firewalla
+from src.firewalla_unofficial_sdk.watch import AlarmWatcher
+
+def alarm(aid, ts):
+    return {"gid": "box-1", "aid": aid, "ts": ts, "message": f"Alarm {aid}"}
+
+def test_watch_dedupes_and_dispatches():
+    now = time.time()
+    client = MagicMock()
+    client.get_alarms.side_effect = [
+        {"results": [alarm(2, now - 1), alarm(1, now - 2)], "next_cursor": None},
+        {"results": [alarm(2, now - 1), alarm(3, now)], "next_cursor": None},
+        {"results": [alarm(3, now)], "next_cursor": None},
+    ]
+    received = []
+    watcher = AlarmWatcher(client, [received.append], query="type:1", min_interval=0, max_interval=0)
+    watcher.run(max_polls=3)
+
+    assert sorted(a["aid"] for a in received) == [1, 2, 3]
+    metrics = watcher.metrics
+    assert metrics["polls"] == 3
+    assert metrics["alarms_seen"] == 3
+    assert metrics["duplicates"] == 2
+    assert metrics["dispatched"] == 3
+    assert metrics["latency_max"] >= 0
+
+    queries = [call.kwargs["params"]["query"] for call in client.get_alarms.call_args_list]
+    assert queries[0] == "type:1"
+    assert queries[2] == f"type:1 ts:>{now - 1.0}"
+
+def test_watch_follows_cursor():
+    client = MagicMock()
+    client.get_alarms.side_effect = [
+        {"results": [alarm(1, 1.0)], "next_cursor": "page-2"},
+        {"results": [alarm(2, 2.0)], "next_cursor": None},
+    ]
+    watcher = AlarmWatcher(client, [], min_interval=0)
+    assert [a["aid"] for a in watcher.poll_once()] == [1, 2]
+    assert client.get_alarms.call_args.kwargs["params"]["cursor"] == "page-2"
+    watcher.run(max_polls=0)
+
+def test_truncated_poll_continues_before_moving_on():
+    client = MagicMock()
+    client.get_alarms.side_effect = [
+        # A burst larger than one poll may fetch, newest first
+        {"results": [alarm(4, 4.0)], "next_cursor": "page-2"},
+        {"results": [alarm(3, 3.0)], "next_cursor": "page-3"},
+        {"results": [alarm(2, 2.0)], "next_cursor": "page-4"},
+        {"results": [alarm(1, 1.0)], "next_cursor": None},
+        {"results": [alarm(5, 5.0)], "next_cursor": None},
+    ]
+    watcher = AlarmWatcher(client, [], query="type:1", since=0.5, max_pages=2, overlap=0)
+    assert [a["aid"] for a in watcher.poll_once()] == [3, 4]
+    assert watcher.last_ts == 0.5
+    assert watcher.metrics["truncated_polls"] == 1
+    assert [a["aid"] for a in watcher.poll_once()] == [1, 2]
+    assert watcher.last_ts == 4.0
+    assert [a["aid"] for a in watcher.poll_once()] == [5]
+
+    params = [call.kwargs["params"] for call in client.get_alarms.call_args_list]
+    assert [p["cursor"] for p in params] == [None, "page-2", "page-3", "page-4", None]
+    assert [p["query"] for p in params] == ["type:1 ts:>0.5"] * 4 + ["type:1 ts:>4.0"]
+    assert watcher.metrics["truncated_polls"] == 1
+    watcher.run(max_polls=0)
+
+def test_adaptive_interval():
+    client = MagicMock()
+    watcher = AlarmWatcher(client, [], min_interval=1, max_interval=5, backoff=2)
+    client.get_alarms.return_value = {"results": []}
+    watcher.poll_once()
+    watcher.poll_once()
+    assert watcher.interval == 4
+    watcher.poll_once()
+    assert watcher.interval == 5
+    client.get_alarms.return_value = {"error": "Timeout occurred: timed out"}
+    watcher.poll_once()
+    assert watcher.metrics["poll_errors"] == 1
+    assert watcher.last_error == "Timeout occurred: timed out"
+    client.get_alarms.return_value = {"results": [alarm(1, 1.0)]}
+    watcher.poll_once()
+    assert watcher.interval == 1
+
+def test_seen_set_is_bounded():
+    watcher = AlarmWatcher(MagicMock(), [], seen_size=2)
+    for aid in range(5):
+        watcher._is_new(alarm(aid, aid))
+    assert list(watcher.seen) == [("box-1", 3), ("box-1", 4)]
+
+def test_handler_errors_are_counted():
+    def failing(_):
+        raise RuntimeError("boom")
+
+    client = MagicMock()
+    client.get_alarms.return_value = [alarm(1, 1.0)]
+    watcher = AlarmWatcher(client, [failing], min_interval=0).run(max_polls=1)
+    assert watcher.metrics["handler_errors"] == 1
+    assert watcher.metrics["dispatched"] == 1
+
+def test_backpressure_blocks_dispatch():
+    release = threading.Event()
+    watcher = AlarmWatcher(MagicMock(), [lambda _: release.wait()], workers=1, max_pending=1)
+    watcher.dispatch(alarm(1, 1.0))
+    blocked = threading.Thread(target=watcher.dispatch, args=(alarm(2, 2.0),))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(1)
+    assert not blocked.is_alive()
+    watcher.run(max_polls=0)
+
+@patch.object(Firewalla, "get_alarms", return_value={"results": []})
+def test_watch_alarms_background(mock_get_alarms):
+    firewalla = Firewalla(api_key="test_api_key", firewalla_msp_subdomain="test_subdomain")
+    watcher = firewalla.watch_alarms("type:1", [], background=True, min_interval=0.01)
+    time.sleep(0.05)
+    watcher.stop()
+    assert mock_get_alarms.called
+    assert watcher.metrics["polls"] >= 1